@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+命令队列管理工具
+离线查看队列：键集分页浏览、查看详情、统计、历史搜索
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional, Tuple
+
+# 添加模块路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config.settings import Settings
+from queue.manager import CommandQueue
+
+
+def encode_cursor(cursor: Optional[Tuple[str, int]]) -> str:
+    """游标编码为命令行参数"""
+    return f"{cursor[0]},{cursor[1]}" if cursor else ""
+
+
+def decode_cursor(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """解析命令行传入的游标"""
+    if not value:
+        return None
+    created_at, _, cmd_id = value.rpartition(",")
+    if not created_at or not cmd_id.isdigit():
+        raise argparse.ArgumentTypeError(f"无效的游标: {value}（格式: 'created_at,id'）")
+    return created_at, int(cmd_id)
+
+
+def cmd_list(queue: CommandQueue, args) -> None:
+    """分页列出命令"""
+    rows, next_cursor = queue.page_commands(
+        status=args.status,
+        after=args.after,
+        limit=args.limit,
+        descending=args.desc
+    )
+
+    for row in rows:
+        preview = (row["command_preview"] or "").replace("\n", " ")
+        print(f"#{row['id']:<6} {row['status']:<10} {row['created_at']}  {row['sender']}  {preview}")
+
+    if next_cursor:
+        print(f"\n下一页: --after '{encode_cursor(next_cursor)}'")
+    elif not rows:
+        print("没有命令")
+
+
+def cmd_show(queue: CommandQueue, args) -> None:
+    """查看命令详情"""
+    cmd = queue.get_by_id(args.id)
+    if not cmd:
+        print(f"命令不存在: {args.id}")
+        sys.exit(1)
+
+    for key in ("id", "sender", "subject", "message_id", "status", "retry_count",
+                "created_at", "updated_at", "completed_at"):
+        print(f"{key:<13}: {cmd.get(key)}")
+    print(f"\n[命令]\n{cmd['command']}")
+    if cmd.get("result"):
+        print(f"\n[结果]\n{cmd['result']}")
+    if cmd.get("error"):
+        print(f"\n[错误]\n{cmd['error']}")
+
+
+def cmd_stats(queue: CommandQueue, args) -> None:
+    """队列统计"""
+    for status, count in queue.get_stats().items():
+        print(f"{status:<11}: {count}")
+    print(f"{'db_size':<11}: {queue.get_db_size()} 字节")
+    for status, count in queue.get_outbox_stats().items():
+        print(f"{'outbox_' + status:<11}: {count}")
+
+
+def cmd_search(queue: CommandQueue, args) -> None:
+    """历史搜索"""
+    for row in queue.search(args.query, sender=args.sender, limit=args.limit):
+        snippet = (row["snippet"] or "").replace("\n", " ")
+        print(f"#{row['id']:<6} {row['status']:<10} {row['created_at']}  {row['sender']}  {snippet}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="邮件命令队列管理工具")
+    parser.add_argument('--db', type=str, help="数据库路径（默认使用配置中的DATABASE_PATH）")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    p_list = subparsers.add_parser('list', help="分页列出命令")
+    p_list.add_argument('-s', '--status', choices=[
+        CommandQueue.STATUS_PENDING, CommandQueue.STATUS_PROCESSING,
+        CommandQueue.STATUS_COMPLETED, CommandQueue.STATUS_FAILED
+    ], help="按状态过滤")
+    p_list.add_argument('-n', '--limit', type=int, default=50, help="每页数量")
+    p_list.add_argument('-a', '--after', type=decode_cursor, help="上一页输出的游标")
+    p_list.add_argument('--desc', action='store_true', help="按时间倒序")
+    p_list.set_defaults(func=cmd_list)
+
+    p_show = subparsers.add_parser('show', help="查看命令详情")
+    p_show.add_argument('id', type=int, help="命令ID")
+    p_show.set_defaults(func=cmd_show)
+
+    p_stats = subparsers.add_parser('stats', help="队列统计")
+    p_stats.set_defaults(func=cmd_stats)
+
+    p_search = subparsers.add_parser('search', help="全文搜索历史命令")
+    p_search.add_argument('query', help="搜索词")
+    p_search.add_argument('--sender', type=str, help="只搜索该发件人")
+    p_search.add_argument('-n', '--limit', type=int, default=20, help="最大数量")
+    p_search.set_defaults(func=cmd_search)
+
+    args = parser.parse_args()
+
+    db_path = args.db or Settings(validate=False).get_db_path()
+    queue = CommandQueue(db_path, use_lock=False)
+    args.func(queue, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@
 从环境变量加载配置，优先从项目根目录.env加载
 """
 
+import json
 import logging
 import os
 import sys
@@ -25,11 +26,27 @@ class Settings:
     DEFAULT_MAX_RETRIES = 3
     DEFAULT_DB_PATH = "commands.db"
     DEFAULT_CLAUDE_TIMEOUT = 3600
+    DEFAULT_IMAP_FETCH_CHUNK_SIZE = 50
+    DEFAULT_IMAP_TIMEOUT = 60
+    DEFAULT_MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+    DEFAULT_MAX_BODY_FETCH_BYTES = 256 * 1024
+    DEFAULT_MAX_COMMAND_LENGTH = 20000
+    DEFAULT_PARSE_POOL_THRESHOLD = 20
+    DEFAULT_DIGEST_WINDOW = 0
+    DEFAULT_RETENTION_DAYS = 7
+    DEFAULT_RETENTION_MAX_DB_MB = 0
+    DEFAULT_RETENTION_INTERVAL = 3600
 
-    def __init__(self):
-        """初始化配置"""
+    def __init__(self, validate: bool = True):
+        """
+        初始化配置
+
+        Args:
+            validate: 是否验证必需配置（管理工具等离线场景可设为False）
+        """
         self._load_env_files()
-        self._validate()
+        if validate:
+            self._validate()
 
     def _load_env_files(self) -> None:
         """
@@ -84,6 +101,8 @@ class Settings:
             "port": int(os.getenv("IMAP_PORT", str(self.DEFAULT_IMAP_PORT))),
             "username": os.getenv("EMAIL_USERNAME", ""),
             "password": os.getenv("EMAIL_PASSWORD", ""),
+            "fetch_chunk_size": int(os.getenv("IMAP_FETCH_CHUNK_SIZE", str(self.DEFAULT_IMAP_FETCH_CHUNK_SIZE))),
+            "timeout": int(os.getenv("IMAP_TIMEOUT", str(self.DEFAULT_IMAP_TIMEOUT))),
         }
 
     def get_smtp_config(self) -> dict:
@@ -95,6 +114,102 @@ class Settings:
             "password": os.getenv("EMAIL_PASSWORD", ""),
         }
 
+    def get_smtp_rate_limit(self) -> dict:
+        """
+        获取SMTP限速配置，覆盖服务商默认值（未设置的项为None，沿用默认）
+
+        Returns:
+            per_minute（每分钟发送数，0表示不限速）、burst（突发数）、
+            per_session（单个会话最多发送数，0表示不限制）
+        """
+        def optional(name: str, cast):
+            value = os.getenv(name, "").strip()
+            return cast(value) if value else None
+
+        return {
+            "per_minute": optional("SMTP_RATE_PER_MINUTE", float),
+            "burst": optional("SMTP_RATE_BURST", int),
+            "per_session": optional("SMTP_MESSAGES_PER_SESSION", int),
+        }
+
+    def get_imap_folders(self) -> list:
+        """获取主账号监听的邮件夹列表"""
+        folders = os.getenv("IMAP_FOLDERS", "INBOX")
+        return [folder.strip() for folder in folders.split(",") if folder.strip()]
+
+    def get_mail_accounts(self) -> list:
+        """
+        获取所有邮件账号配置（主账号 + EMAIL_ACCOUNTS_FILE 中的附加账号）
+
+        附加账号文件为JSON数组，每项至少包含 username、password，
+        其余字段（imap_server、imap_port、smtp_server、smtp_port、folders、whitelist、
+        processed_folder、rejected_folder、failed_folder）缺省时沿用主账号配置
+
+        Returns:
+            账号配置字典列表，第一个为主账号
+        """
+        imap_config = self.get_imap_config()
+        smtp_config = self.get_smtp_config()
+
+        primary = {
+            "username": imap_config["username"],
+            "password": imap_config["password"],
+            "imap_server": imap_config["server"],
+            "imap_port": imap_config["port"],
+            "smtp_server": smtp_config["server"],
+            "smtp_port": smtp_config["port"],
+            "folders": self.get_imap_folders(),
+            "whitelist": self.get_whitelist(),
+            "fetch_chunk_size": imap_config["fetch_chunk_size"],
+            "timeout": imap_config["timeout"],
+            **self.get_move_folders(),
+        }
+        accounts = [primary]
+
+        accounts_file = os.getenv("EMAIL_ACCOUNTS_FILE")
+        if not accounts_file:
+            return accounts
+
+        try:
+            with open(accounts_file, 'r', encoding='utf-8') as f:
+                extra_accounts = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取附加账号配置失败: {accounts_file}: {e}")
+            return accounts
+
+        seen = {primary["username"]}
+        for extra in extra_accounts:
+            if not extra.get("username") or not extra.get("password"):
+                logger.warning("附加账号缺少 username 或 password，已忽略")
+                continue
+            if extra["username"] in seen:
+                logger.warning(f"附加账号重复，已忽略: {extra['username']}")
+                continue
+            seen.add(extra["username"])
+
+            account = dict(primary)
+            account["folders"] = ["INBOX"]
+            account.update({key: value for key, value in extra.items() if value is not None})
+            account["imap_port"] = int(account["imap_port"])
+            account["smtp_port"] = int(account["smtp_port"])
+            accounts.append(account)
+
+        return accounts
+
+    def get_move_folders(self) -> dict:
+        """
+        获取处理后归档的目标邮件夹（为空表示留在原邮件夹）
+
+        Returns:
+            processed_folder（已入队/已回答）、rejected_folder（白名单或大小拒绝）、
+            failed_folder（解析处理失败）
+        """
+        return {
+            "processed_folder": os.getenv("MOVE_PROCESSED_FOLDER", ""),
+            "rejected_folder": os.getenv("MOVE_REJECTED_FOLDER", ""),
+            "failed_folder": os.getenv("MOVE_FAILED_FOLDER", ""),
+        }
+
     def get_whitelist(self) -> list:
         """获取白名单发件人列表"""
         whitelist = os.getenv("EMAIL_WHITELIST", "")
@@ -118,6 +233,48 @@ class Settings:
         """获取Claude执行超时（秒）"""
         return int(os.getenv("CLAUDE_TIMEOUT", str(self.DEFAULT_CLAUDE_TIMEOUT)))
 
+    def get_max_message_size(self) -> int:
+        """获取可接受的最大邮件大小（字节），超过则只凭邮件头拒绝"""
+        return int(os.getenv("MAX_MESSAGE_SIZE", str(self.DEFAULT_MAX_MESSAGE_SIZE)))
+
+    def get_max_body_fetch_bytes(self) -> int:
+        """获取每封邮件最多下载的字节数"""
+        return int(os.getenv("MAX_BODY_FETCH_BYTES", str(self.DEFAULT_MAX_BODY_FETCH_BYTES)))
+
+    def get_max_command_length(self) -> int:
+        """获取命令正文最大字符数（HTML正文转换达到后即停止）"""
+        return int(os.getenv("MAX_COMMAND_LENGTH", str(self.DEFAULT_MAX_COMMAND_LENGTH)))
+
+    def get_parse_pool_workers(self) -> int:
+        """获取正文解析子进程数量（0表示禁用；默认CPU核数减一，最多4个，单核机器不启用）"""
+        default = min(4, (os.cpu_count() or 1) - 1)
+        return int(os.getenv("PARSE_POOL_WORKERS", str(default)))
+
+    def get_parse_pool_threshold(self) -> int:
+        """获取使用解析进程池的最小批量"""
+        return int(os.getenv("PARSE_POOL_THRESHOLD", str(self.DEFAULT_PARSE_POOL_THRESHOLD)))
+
+    def get_digest_window(self) -> int:
+        """获取回复摘要窗口（秒，0表示每条结果单独回复）"""
+        return int(os.getenv("DIGEST_WINDOW", str(self.DEFAULT_DIGEST_WINDOW)))
+
+    def get_retention_days(self) -> int:
+        """获取已完成命令保留天数"""
+        return int(os.getenv("RETENTION_DAYS", str(self.DEFAULT_RETENTION_DAYS)))
+
+    def get_retention_max_db_bytes(self) -> int:
+        """获取数据库大小上限（字节，0表示不限制）"""
+        max_mb = float(os.getenv("RETENTION_MAX_DB_MB", str(self.DEFAULT_RETENTION_MAX_DB_MB)))
+        return int(max_mb * 1024 * 1024)
+
+    def get_retention_interval(self) -> int:
+        """获取保留策略清理间隔（秒）"""
+        return int(os.getenv("RETENTION_INTERVAL", str(self.DEFAULT_RETENTION_INTERVAL)))
+
+    def get_archive_dir(self) -> str:
+        """获取历史归档目录（为空表示不归档，直接删除）"""
+        return os.getenv("ARCHIVE_DIR", "")
+
     def get_project_dir(self) -> str:
         """
         获取项目目录（带验证和智能检测）
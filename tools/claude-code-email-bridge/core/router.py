@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+管理命令路由
+入队前识别保留关键词（status、queue、cancel、retry、result、search:），直接从命令数据库回答，
+不占用Claude执行能力；只能查看和操作发件人自己的命令
+"""
+
+import logging
+import re
+from typing import Optional, Tuple
+
+from queue.manager import CommandQueue
+
+logger = logging.getLogger(__name__)
+
+# 整封邮件只有一个关键词（可带命令ID）才视为管理命令，避免误判普通指令
+_ADMIN_RE = re.compile(r"^(status|queue|cancel|retry|result)(?:\s+#?(\d+))?$", re.IGNORECASE)
+
+
+class CommandRouter:
+    """管理命令路由器"""
+
+    SEARCH_PREFIX = "search:"
+    SEARCH_LIMIT = 10
+    QUEUE_LIMIT = 20
+    # 需要命令ID的关键词
+    ID_KEYWORDS = ("cancel", "retry", "result")
+
+    def __init__(self, queue: CommandQueue):
+        """
+        初始化路由器
+
+        Args:
+            queue: 命令队列
+        """
+        self.queue = queue
+
+    def route(self, sender: str, command: str) -> Optional[Tuple[str, str]]:
+        """
+        识别并回答管理命令
+
+        Args:
+            sender: 发件人邮箱
+            command: 命令正文（已去除首尾空白）
+
+        Returns:
+            (回复主题, 回复正文)；不是管理命令返回None，由调用方入队交给Claude
+        """
+        if command.lower().startswith(self.SEARCH_PREFIX):
+            return self._search(sender, command[len(self.SEARCH_PREFIX):].strip())
+
+        match = _ADMIN_RE.match(command)
+        if not match:
+            return None
+
+        keyword = match.group(1).lower()
+        cmd_id = int(match.group(2)) if match.group(2) else None
+        logger.info(f"管理命令: {keyword} {cmd_id or ''}, from={sender}")
+
+        if keyword in self.ID_KEYWORDS:
+            if cmd_id is None:
+                return f"📋 {keyword}", f"用法: {keyword} <命令ID>"
+            handler = getattr(self, f"_{keyword}")
+            return f"📋 {keyword} #{cmd_id}", handler(sender, cmd_id)
+
+        if cmd_id is not None:
+            return None
+        if keyword == "status":
+            return "📋 队列状态", self._status(sender)
+        return "📋 排队命令", self._queue(sender)
+
+    def _own(self, sender: str, cmd_id: int) -> Optional[dict]:
+        """获取发件人自己的命令（他人的命令视为不存在）"""
+        cmd = self.queue.get_by_id(cmd_id)
+        if not cmd or cmd["sender"] != sender:
+            return None
+        return cmd
+
+    def _status(self, sender: str) -> str:
+        """队列整体状态"""
+        stats = self.queue.get_stats()
+        outbox = self.queue.get_outbox_stats()
+        active = self.queue.get_active_commands(sender, limit=self.QUEUE_LIMIT)
+        lines = [
+            "队列状态:",
+            f"  待处理: {stats.get(CommandQueue.STATUS_PENDING, 0)}",
+            f"  执行中: {stats.get(CommandQueue.STATUS_PROCESSING, 0)}",
+            f"  已完成: {stats.get(CommandQueue.STATUS_COMPLETED, 0)}",
+            f"  失败: {stats.get(CommandQueue.STATUS_FAILED, 0)}",
+            f"  待发送回复: {outbox.get(CommandQueue.OUTBOX_PENDING, 0) + outbox.get(CommandQueue.OUTBOX_SENDING, 0)}",
+            "",
+            f"你的排队命令: {len(active)} 条（发送 queue 查看详情）",
+        ]
+        return "\n".join(lines)
+
+    def _queue(self, sender: str) -> str:
+        """发件人排队中和执行中的命令"""
+        active = self.queue.get_active_commands(sender, limit=self.QUEUE_LIMIT)
+        if not active:
+            return "你没有排队中的命令。"
+
+        lines = [f"你的排队命令（{len(active)} 条）:", ""]
+        for row in active:
+            if row["status"] == CommandQueue.STATUS_PROCESSING:
+                position = "执行中"
+            else:
+                position = f"前面还有 {row['ahead']} 条"
+            lines.append(f"#{row['id']} [{row['status']}] {row['created_at']} - {row['subject'] or '无主题'}（{position}）")
+            lines.append(f"    {(row['preview'] or '').strip()}")
+            lines.append("")
+        lines.append("取消: cancel <命令ID>")
+        return "\n".join(lines)
+
+    def _cancel(self, sender: str, cmd_id: int) -> str:
+        """取消待处理命令"""
+        if self.queue.cancel(cmd_id, sender):
+            logger.info(f"命令已被发件人取消: id={cmd_id}, from={sender}")
+            return f"命令 #{cmd_id} 已取消。"
+
+        cmd = self._own(sender, cmd_id)
+        if not cmd:
+            return f"命令 #{cmd_id} 不存在。"
+        if cmd["status"] == CommandQueue.STATUS_PROCESSING:
+            return f"命令 #{cmd_id} 正在执行，无法取消。"
+        return f"命令 #{cmd_id} 状态为 {cmd['status']}，无需取消。"
+
+    def _retry(self, sender: str, cmd_id: int) -> str:
+        """重新排队失败命令"""
+        if self.queue.requeue(cmd_id, sender):
+            logger.info(f"命令已被发件人重新排队: id={cmd_id}, from={sender}")
+            return f"命令 #{cmd_id} 已重新排队。"
+
+        cmd = self._own(sender, cmd_id)
+        if not cmd:
+            return f"命令 #{cmd_id} 不存在。"
+        return f"命令 #{cmd_id} 状态为 {cmd['status']}，只有失败的命令可以重试。"
+
+    def _result(self, sender: str, cmd_id: int) -> str:
+        """命令详情和结果"""
+        cmd = self._own(sender, cmd_id)
+        if not cmd:
+            return f"命令 #{cmd_id} 不存在。"
+
+        lines = [
+            f"命令 #{cmd_id} - {cmd['subject'] or '无主题'}",
+            f"状态: {cmd['status']}",
+            f"创建时间: {cmd['created_at']}",
+        ]
+        if cmd.get("completed_at"):
+            lines.append(f"完成时间: {cmd['completed_at']}")
+        lines.extend(["", "[命令]", cmd["command"]])
+        if cmd.get("result"):
+            lines.extend(["", "[结果]", cmd["result"]])
+        if cmd.get("error"):
+            lines.extend(["", "[错误]", cmd["error"]])
+        return "\n".join(lines)
+
+    def _search(self, sender: str, query: str) -> Tuple[str, str]:
+        """从全文索引回答历史搜索，只返回发件人自己的命令"""
+        results = self.queue.search(query, sender=sender, limit=self.SEARCH_LIMIT)
+        logger.info(f"历史搜索: query={query[:50]}, hits={len(results)}, from={sender}")
+
+        if not query:
+            body = f"用法: {self.SEARCH_PREFIX} <关键词>"
+        elif not results:
+            body = f"未找到与 \"{query}\" 相关的历史命令。"
+        else:
+            lines = [f"与 \"{query}\" 相关的历史命令（{len(results)} 条）:", ""]
+            for row in results:
+                lines.append(f"#{row['id']} [{row['status']}] {row['created_at']} - {row['subject'] or '无主题'}")
+                lines.append(f"    {(row['snippet'] or '').strip()}")
+                lines.append("")
+            body = "\n".join(lines)
+
+        return f"🔍 历史搜索 - {query[:30]}", body
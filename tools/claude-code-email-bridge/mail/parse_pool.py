@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+多进程邮件正文解析
+大批量收取时把MIME解码、HTML转换等CPU密集的第二阶段解析分发到子进程
+
+注意：本项目的 queue 包会遮蔽标准库 queue，multiprocessing.Pool 和
+concurrent.futures.ProcessPoolExecutor 依赖标准库 queue 无法使用，
+因此直接用 multiprocessing.Process + Pipe 实现，每个子进程同时只处理一封邮件
+"""
+
+import logging
+import multiprocessing
+import threading
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List, Optional
+
+from .parser import EmailParser
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(conn: Connection, parser_options: dict) -> None:
+    """子进程主循环：接收原始邮件字节，返回 (是否成功, 命令文本或错误信息)"""
+    parser = EmailParser(**parser_options)
+    while True:
+        try:
+            raw_email = conn.recv_bytes()
+        except EOFError:
+            return
+        if not raw_email:
+            return
+        try:
+            conn.send((True, parser.parse_body(raw_email)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class ParsePool:
+    """正文解析进程池（按需启动，常驻复用）"""
+
+    # 子进程启动方式：收取线程运行中fork不安全，使用spawn
+    START_METHOD = "spawn"
+    RESULT_TIMEOUT = 60
+
+    def __init__(self, workers: int, threshold: int, parser_options: Optional[dict] = None):
+        """
+        初始化进程池
+
+        Args:
+            workers: 子进程数量，0表示禁用（始终在当前线程解析）
+            threshold: 一批正文数量达到该值才使用进程池
+            parser_options: 子进程中 EmailParser 的参数（max_parse_bytes、max_command_length）
+        """
+        self.workers = workers
+        self.threshold = threshold
+        self.parser_options = parser_options or {}
+        self._processes: List[multiprocessing.Process] = []
+        self._conns: List[Connection] = []
+        self._lock = threading.Lock()
+
+    def should_use(self, batch_size: int) -> bool:
+        """该批数量是否值得使用进程池"""
+        return self.workers > 0 and batch_size >= max(self.threshold, 2)
+
+    def _start(self) -> None:
+        """启动子进程"""
+        context = multiprocessing.get_context(self.START_METHOD)
+        for i in range(self.workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(child_conn, self.parser_options),
+                name=f"parse-worker-{i}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._conns.append(parent_conn)
+        logger.info(f"正文解析进程池已启动: {self.workers} 个子进程")
+
+    def parse_bodies(self, raw_emails: Dict[int, bytes]) -> Dict[int, str]:
+        """
+        并行解析一批邮件正文
+
+        Args:
+            raw_emails: UID → 原始邮件字节
+
+        Returns:
+            UID → 命令文本；解析出错或进程池故障的邮件不在结果中，由调用方在本地重新解析
+        """
+        results: Dict[int, str] = {}
+        # 空字节是子进程的退出信号，空邮件留给本地解析
+        items = [(uid, raw_email) for uid, raw_email in raw_emails.items() if raw_email]
+        if not items:
+            return results
+
+        with self._lock:
+            try:
+                if not self._processes:
+                    self._start()
+                self._dispatch(items, results)
+            except Exception as e:
+                logger.error(f"进程池解析失败，改为本地解析: {e}")
+                self._stop()
+        return results
+
+    def _dispatch(self, items: list, results: Dict[int, str]) -> None:
+        """每个子进程同时只处理一封，完成一封再发下一封（避免双向管道写满互相阻塞）"""
+        pending = iter(items)
+        in_flight: Dict[Connection, int] = {}
+
+        for conn in self._conns:
+            item = next(pending, None)
+            if item is None:
+                break
+            conn.send_bytes(item[1])
+            in_flight[conn] = item[0]
+
+        while in_flight:
+            ready = wait(list(in_flight), timeout=self.RESULT_TIMEOUT)
+            if not ready:
+                raise TimeoutError(f"等待解析结果超时（{self.RESULT_TIMEOUT} 秒）")
+
+            for conn in ready:
+                uid = in_flight.pop(conn)
+                ok, value = conn.recv()
+                if ok:
+                    results[uid] = value
+                else:
+                    logger.debug(f"子进程解析失败: uid={uid}, {value}")
+
+                item = next(pending, None)
+                if item is not None:
+                    conn.send_bytes(item[1])
+                    in_flight[conn] = item[0]
+
+    def _stop(self) -> None:
+        """关闭子进程"""
+        for conn in self._conns:
+            try:
+                conn.send_bytes(b"")
+            except OSError:
+                pass
+            conn.close()
+        for process in self._processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._conns = []
+
+    def close(self) -> None:
+        """停止进程池"""
+        with self._lock:
+            if self._processes:
+                self._stop()
+                logger.info("正文解析进程池已停止")
@@ -7,28 +7,171 @@
 import email
 import re
 import logging
+from email.feedparser import BytesFeedParser
 from email.message import Message
-from typing import Optional, Dict, Any
+from email.parser import BytesHeaderParser
+from typing import Optional, Dict, Any, BinaryIO, Iterator, Union
 from email.header import decode_header
+from html.parser import HTMLParser
+
+from .whitelist import WhitelistMatcher
 
 logger = logging.getLogger(__name__)
 
+_WHITESPACE_RE = re.compile(r"\s+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# 回复引用的起始标记（从第一个匹配处截断）
+# 以字面换行开头（扫描前在正文前补一个换行），正则引擎可按前缀快速跳过非行首位置
+# 中文客户端标记的日期部分: 2024年1月1日 / 2024-01-01 / 2024/1/1
+_MARKER_DATE = r"\d{2,4}[ \t]*[年/.-][ \t]*\d{1,2}"
+_REPLY_MARKER_RE = re.compile(
+    r"\n(?:"
+    # Outlook/QQ邮箱/163 分隔线（整行）: -----Original Message----- / ---- 原始邮件 ---- / --- 回复的原邮件 ---
+    r"[-_=]{3,}[ \t\xa0]*"
+    r"(?i:original message|forwarded message|original|reply|forward|原始邮件|回复的原邮件|转发邮件)"
+    r"[ \t\xa0]*[-_=]*[ \t\xa0]*$"
+    r"|[ \t]*(?:"
+    # Outlook网页版: 下划线分隔 + From:/发件人: 头
+    r"_{10,}[ \t]*\n[ \t]*(?i:from|发件人)[:：]"
+    # Outlook: From:/发件人: 后紧跟 Sent:/Date:/发送时间: 头
+    r"|(?i:from|发件人)[:：][^\n]*\n[ \t]*(?i:sent|date|发送时间|日期|时间)[:：]"
+    # Gmail/Apple Mail: On ... wrote:（可能折成两行）
+    r"|On\b[^\n]*(?:\n[^\n]*)?\bwrote:[ \t]*$"
+    # 中文客户端: 在 2024年1月1日 ...，发件人 写道： / 发件人 于2024年1月1日 ... 写道：
+    r"|在[ \t]*" + _MARKER_DATE + r"[^\n]*[,，][^\n]*(?:\n[^\n]*)?写道[:：]?[ \t]*$"
+    r"|(?!>)[^\n]*?\S[ \t]*于[ \t]*" + _MARKER_DATE + r"[^\n]*写道[:：]?[ \t]*$"
+    r"))",
+    re.MULTILINE
+)
+
+# 行内引用（"> " 开头的行）
+_QUOTED_LINE_RE = re.compile(r"^[ \t]*>[^\n]*(?:\n|$)", re.MULTILINE)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """
+    增量HTML转纯文本
+
+    跳过 style/script/head，遇到各客户端的引用标记即截止（之后都是被引用的原邮件），
+    块级元素转换为换行，累计文本达到上限后停止解析剩余内容
+    """
+
+    SKIP_TAGS = {"style", "script", "head", "title"}
+    # 引用标记：Gmail、Outlook、163、Yahoo、Apple Mail/Thunderbird。
+    # Outlook 的 appendonsend 是空div、divRplyFwdMsg 只包含发件人/时间，
+    # 被引用的原文是其后的兄弟元素，因此按截止点而非容器处理。
+    # 不带这些标记的 blockquote 是客户端的缩进格式（新写的内容），按普通块级元素保留
+    QUOTE_ATTRS = {
+        ("class", "gmail_quote"),
+        ("id", "divrplyfwdmsg"),
+        ("id", "appendonsend"),
+        ("id", "isreplycontent"),
+        ("class", "yahoo_quoted"),
+        ("type", "cite"),
+    }
+    BLOCK_TAGS = {
+        "p", "div", "br", "li", "tr", "table", "ul", "ol", "pre", "hr", "blockquote",
+        "h1", "h2", "h3", "h4", "h5", "h6",
+    }
+    VOID_TAGS = {"br", "hr", "img", "meta", "link", "input", "wbr", "col", "area", "base"}
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.done = False
+        self._parts = []
+        self._length = 0
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+
+    def _is_quote(self, attrs) -> bool:
+        for name, value in attrs:
+            if name in ("class", "id", "type") and value:
+                for token in value.lower().split():
+                    if (name, token) in self.QUOTE_ATTRS:
+                        return True
+        return False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self._skip_tag:
+            if tag == self._skip_tag and tag not in self.VOID_TAGS:
+                self._skip_depth += 1
+            return
+        if self._is_quote(attrs):
+            self.done = True
+            return
+        if tag in self.SKIP_TAGS:
+            self._skip_tag = tag
+            self._skip_depth = 1
+            return
+        if tag in self.BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+        if tag in self.BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data):
+        if self._skip_tag or self.done:
+            return
+        text = _WHITESPACE_RE.sub(" ", data)
+        if text.strip():
+            self._parts.append(text)
+            self._length += len(text)
+            if self._length >= self.max_chars:
+                self.done = True
+
+    def text(self) -> str:
+        lines = (line.strip() for line in "".join(self._parts).split("\n"))
+        text = _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+        return text[:self.max_chars]
+
 
 class EmailParser:
     """邮件解析器"""
 
-    def __init__(self, whitelist: list = None):
+    # 单封邮件最多解析的字节数（正文在前、附件在后，超出部分丢弃）
+    DEFAULT_MAX_PARSE_BYTES = 1024 * 1024
+    FEED_CHUNK_SIZE = 64 * 1024
+    # 命令正文最大字符数（HTML转换达到后即停止）
+    DEFAULT_MAX_COMMAND_LENGTH = 20000
+    HTML_FEED_CHUNK_SIZE = 8192
+
+    def __init__(
+        self,
+        whitelist: list = None,
+        max_parse_bytes: int = DEFAULT_MAX_PARSE_BYTES,
+        max_command_length: int = DEFAULT_MAX_COMMAND_LENGTH
+    ):
         """
         初始化解析器
 
         Args:
             whitelist: 发件人白名单列表
+            max_parse_bytes: 单封邮件最多解析的字节数，限制每封邮件的内存占用
+            max_command_length: 命令正文最大字符数，超出部分截断
         """
         self.whitelist = whitelist or []
+        self.max_parse_bytes = max_parse_bytes
+        self.max_command_length = max_command_length
+        self._matcher = WhitelistMatcher(self.whitelist)
 
     def set_whitelist(self, whitelist: list) -> None:
-        """设置白名单"""
-        self.whitelist = whitelist
+        """设置白名单（先构建新的匹配器再整体替换，判断中的线程不会看到半成品）"""
+        whitelist = whitelist or []
+        matcher = WhitelistMatcher(whitelist)
+        self.whitelist, self._matcher = whitelist, matcher
 
     def extract_sender(self, msg: Message) -> str:
         """
@@ -57,6 +200,8 @@ class EmailParser:
         """
         检查发件人是否在白名单中
 
+        支持精确地址、@域名 和 *.域名（子域名）规则，见 WhitelistMatcher
+
         Args:
             sender: 发件人邮箱
 
@@ -64,11 +209,10 @@ class EmailParser:
             是否在白名单中
         """
         if not self.whitelist:
-            # 没有设置白名单，接受所有发件人
+            # 没有设置白名单，接受所有发件人（条目全部无效时匹配器为空，拒绝所有发件人）
             return True
 
-        sender_lower = sender.lower()
-        return any(allowed.lower() in sender_lower for allowed in self.whitelist)
+        return self._matcher.matches(sender)
 
     def extract_command(self, msg: Message) -> str:
         """
@@ -80,7 +224,7 @@ class EmailParser:
         Returns:
             命令文本
         """
-        body = self._get_body(msg)
+        body = self._get_body(msg)[:self.max_command_length]
         # 去除引用内容
         body = self._strip_replies(body)
         return body.strip()
@@ -110,31 +254,104 @@ class EmailParser:
         subject = msg.get("Subject", "")
         return self._decode_header(subject)
 
-    def parse_email(self, raw_email: bytes) -> Dict[str, Any]:
+    def parse_headers(self, raw_headers: bytes) -> Dict[str, Any]:
         """
-        解析原始邮件字节
+        第一阶段：只解析邮件头（不遍历MIME、不解码正文），用于决定是否需要正文
 
         Args:
-            raw_email: 原始邮件字节
+            raw_headers: 原始邮件头字节（也可以是完整邮件，只取头部）
 
         Returns:
-            包含解析结果的字典
+            包含发件人、ID、主题和白名单判断的字典
         """
-        msg = email.message_from_bytes(raw_email)
-
+        msg = BytesHeaderParser().parsebytes(self._header_block(raw_headers))
         sender = self.extract_sender(msg)
-        message_id = self.extract_message_id(msg)
-        subject = self.extract_subject(msg)
-        command = self.extract_command(msg)
 
         return {
             "sender": sender,
-            "message_id": message_id,
-            "subject": subject,
-            "command": command,
+            "message_id": self.extract_message_id(msg),
+            "in_reply_to": msg.get("In-Reply-To"),
+            "subject": self.extract_subject(msg),
             "is_whitelisted": self.is_sender_whitelisted(sender),
         }
 
+    def parse_body(self, raw_email: Union[bytes, BinaryIO]) -> str:
+        """
+        第二阶段：提取命令正文（解析MIME、HTML转文本、去除引用），只应对通过第一阶段的邮件调用
+
+        Args:
+            raw_email: 原始邮件字节，或大邮件的临时文件（分块读取）
+
+        Returns:
+            命令文本
+        """
+        return self.extract_command(self._parse_message(raw_email))
+
+    def parse_email(self, raw_email: Union[bytes, BinaryIO]) -> Dict[str, Any]:
+        """
+        解析原始邮件（两阶段：先解析邮件头，发件人通过白名单才提取正文）
+
+        Args:
+            raw_email: 原始邮件字节，或大邮件的临时文件
+
+        Returns:
+            包含解析结果的字典（未通过白名单时command为空）
+        """
+        if isinstance(raw_email, (bytes, bytearray)):
+            parsed = self.parse_headers(raw_email)
+        else:
+            parsed = self.parse_headers(raw_email.read(self.FEED_CHUNK_SIZE))
+            raw_email.seek(0)
+
+        parsed["command"] = self.parse_body(raw_email) if parsed["is_whitelisted"] else ""
+        return parsed
+
+    @staticmethod
+    def _header_block(raw: bytes) -> bytes:
+        """截取邮件头部分（到第一个空行为止）"""
+        ends = []
+        for separator in (b"\r\n\r\n", b"\n\n"):
+            end = raw.find(separator)
+            if end >= 0:
+                ends.append(end + len(separator))
+        return raw[:min(ends)] if ends else raw
+
+    def _parse_message(self, raw_email: Union[bytes, BinaryIO]) -> Message:
+        """
+        分块喂给增量解析器，超过max_parse_bytes后停止（截断的附件不会进入内存）
+
+        Args:
+            raw_email: 原始邮件字节或文件
+
+        Returns:
+            邮件对象
+        """
+        parser = BytesFeedParser()
+        remaining = self.max_parse_bytes
+
+        for chunk in self._iter_chunks(raw_email):
+            if len(chunk) >= remaining:
+                parser.feed(chunk[:remaining])
+                logger.debug(f"邮件超过 {self.max_parse_bytes} 字节，其余部分未解析")
+                break
+            parser.feed(chunk)
+            remaining -= len(chunk)
+
+        return parser.close()
+
+    def _iter_chunks(self, raw_email: Union[bytes, BinaryIO]) -> Iterator[bytes]:
+        """按FEED_CHUNK_SIZE切分邮件内容"""
+        if isinstance(raw_email, (bytes, bytearray)):
+            for i in range(0, len(raw_email), self.FEED_CHUNK_SIZE):
+                yield raw_email[i:i + self.FEED_CHUNK_SIZE]
+            return
+
+        while True:
+            chunk = raw_email.read(self.FEED_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
     def _get_body(self, msg: Message) -> str:
         """
         提取邮件正文（纯文本优先）
@@ -186,7 +403,7 @@ class EmailParser:
 
     def _html_to_text(self, html: str) -> str:
         """
-        简单的HTML转纯文本
+        HTML转纯文本（分块增量解析，跳过样式、脚本和引用块，达到命令长度上限即停止）
 
         Args:
             html: HTML内容
@@ -194,37 +411,35 @@ class EmailParser:
         Returns:
             纯文本内容
         """
-        # 移除HTML标签
-        text = re.sub(r"<[^>]+>", " ", html)
-        # 移除多余的空白
-        text = re.sub(r"\s+", " ", text)
-        return text.strip()
+        extractor = _HTMLTextExtractor(self.max_command_length)
+        for i in range(0, len(html), self.HTML_FEED_CHUNK_SIZE):
+            extractor.feed(html[i:i + self.HTML_FEED_CHUNK_SIZE])
+            if extractor.done:
+                break
+        else:
+            extractor.close()
+        return extractor.text()
 
     def _strip_replies(self, text: str) -> str:
         """
         去除邮件回复引用内容
 
+        单次扫描找到第一个引用标记（Gmail、Outlook、QQ邮箱、163及"在...写道"等）并截断，
+        再去掉其前面以 ">" 开头的行内引用
+
         Args:
             text: 邮件正文
 
         Returns:
             去除引用后的正文
         """
-        lines = text.split("\n")
-        result = []
-
-        for line in lines:
-            # 跳过引用行
-            if line.strip().startswith(">"):
-                continue
-            # 跳过常见的回复分隔符
-            if re.match(r"^[-_]{3,}\s*(Original|Reply|Forward)", line, re.IGNORECASE):
-                break
-            if re.match(r"^On.*wrote:", line):
-                break
-            result.append(line)
-
-        return "\n".join(result).strip()
+        scan = "\n" + text
+        match = _REPLY_MARKER_RE.search(scan)
+        if match:
+            text = scan[:match.start()]
+        if ">" in text:
+            text = _QUOTED_LINE_RE.sub("", text)
+        return text.strip()
 
     def _decode_header(self, header: str) -> str:
         """
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+SMTP发送速率限制
+按服务商令牌桶限速（同一进程内同一服务商的所有账号共享），突发完成的结果以可持续的最大速率发出，
+避免触发QQ/163等服务商的频率限制或封号。限速状态在进程内，回复只由一个收取进程（all/intake）发送
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate: float, burst: int):
+        """
+        初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数，0表示不限速
+            burst: 桶容量（允许的最大突发数量）
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """按经过的时间补充令牌"""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        取一个令牌，不足时阻塞等待
+
+        Returns:
+            等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # 先扣减再等待：并发调用方按到达顺序排队，不会同时醒来争抢
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+# 服务商默认限制（保守取值）：每分钟发送数、突发数、单个会话最多发送数
+PROVIDER_LIMITS: Dict[str, Dict[str, float]] = {
+    "qq.com": {"per_minute": 20, "burst": 5, "per_session": 20},
+    "163.com": {"per_minute": 15, "burst": 3, "per_session": 10},
+    "126.com": {"per_minute": 15, "burst": 3, "per_session": 10},
+    "yeah.net": {"per_minute": 15, "burst": 3, "per_session": 10},
+    "gmail.com": {"per_minute": 60, "burst": 10, "per_session": 100},
+}
+DEFAULT_LIMITS = {"per_minute": 30, "burst": 5, "per_session": 50}
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def provider_of(server: str) -> str:
+    """SMTP服务器所属服务商（smtp.exmail.qq.com → qq.com），未知服务商为服务器地址本身"""
+    host = server.strip().lower().rstrip(".")
+    for domain in PROVIDER_LIMITS:
+        if host == domain or host.endswith("." + domain):
+            return domain
+    return host
+
+
+def provider_limits(server: str, overrides: Optional[dict] = None) -> dict:
+    """
+    获取服务商的发送限制
+
+    Args:
+        server: SMTP服务器地址
+        overrides: 配置覆盖（per_minute、burst、per_session，None值表示沿用默认）
+
+    Returns:
+        限制字典（per_minute、burst、per_session）
+    """
+    limits = dict(PROVIDER_LIMITS.get(provider_of(server), DEFAULT_LIMITS))
+    if overrides:
+        limits.update({key: value for key, value in overrides.items() if value is not None})
+    return limits
+
+
+def get_bucket(server: str, per_minute: float, burst: int) -> TokenBucket:
+    """
+    获取服务商共享的令牌桶（首次获取时按给定参数创建）
+
+    Args:
+        server: SMTP服务器地址
+        per_minute: 每分钟发送数，0表示不限速
+        burst: 突发数
+
+    Returns:
+        令牌桶
+    """
+    provider = provider_of(server)
+    with _buckets_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            bucket = TokenBucket(per_minute / 60.0, int(burst))
+            _buckets[provider] = bucket
+        return bucket
@@ -4,21 +4,146 @@ IMAP邮件接收器
 支持IDLE模式和轮询降级
 """
 
+import base64
 import imaplib
 import email
 import logging
+import random
+import re
 import select
+import socket
+import ssl
+import tempfile
 import time
-from typing import List, Optional
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
 from email.message import Message
 
 logger = logging.getLogger(__name__)
 
 
+# UID参数兼容 bytes/int/str
+Uid = Union[bytes, int, str]
+
+# 邮件内容：小邮件为字节，大邮件为已回到开头的临时文件（调用方负责关闭）
+RawEmail = Union[bytes, BinaryIO]
+
+# FETCH响应中的UID和大小字段
+_FETCH_UID_RE = re.compile(rb"UID (\d+)")
+_FETCH_SIZE_RE = re.compile(rb"RFC822\.SIZE (\d+)")
+
+# IDLE期间表示邮箱有变化的未标记响应
+_IDLE_EVENT_RE = re.compile(rb"^\* \d+ (EXISTS|RECENT|EXPUNGE|FETCH)\b", re.IGNORECASE)
+
+# 需要加引号的邮件夹名字符（RFC 3501 atom-specials）
+_MAILBOX_SPECIALS = set(' "\\(){%*]')
+
+
+def _encode_mailbox(name: str) -> str:
+    """
+    将邮件夹名编码为IMAP参数：非ASCII字符使用修改版UTF-7（RFC 3501 5.1.3），
+    含空格等特殊字符时加引号（如 "已处理"、"Sent Messages"）
+
+    Args:
+        name: 邮件夹名
+
+    Returns:
+        可直接用于命令的邮件夹参数
+    """
+    parts = []
+    pending = []
+
+    def flush():
+        if pending:
+            encoded = base64.b64encode("".join(pending).encode("utf-16-be")).decode("ascii")
+            parts.append("&" + encoded.rstrip("=").replace("/", ",") + "-")
+            pending.clear()
+
+    for ch in name:
+        if 0x20 <= ord(ch) <= 0x7e:
+            flush()
+            parts.append("&-" if ch == "&" else ch)
+        else:
+            pending.append(ch)
+    flush()
+
+    encoded = "".join(parts)
+    if not encoded or any(ch in _MAILBOX_SPECIALS for ch in encoded):
+        return '"' + encoded.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return encoded
+
+
+class _SpoolingIMAP4_SSL(imaplib.IMAP4_SSL):
+    """
+    大字面量直接流式写入 SpooledTemporaryFile 的IMAP客户端
+
+    imaplib默认把整个字面量读入一个bytes；超过阈值的字面量改为分块读入临时文件
+    （内存中最多保留阈值大小，超出部分落盘），避免大邮件造成内存峰值
+    """
+
+    spool_threshold = 256 * 1024
+    READ_CHUNK_SIZE = 64 * 1024
+
+    def read(self, size: int):
+        if size <= self.spool_threshold:
+            return super().read(size)
+
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold)
+        remaining = size
+        try:
+            while remaining:
+                data = self.file.read(min(remaining, self.READ_CHUNK_SIZE))
+                if not data:
+                    raise self.abort("读取邮件内容时连接已关闭")
+                spool.write(data)
+                remaining -= len(data)
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+
 class EmailReceiver:
     """IMAP邮件接收器"""
 
-    def __init__(self, server: str, port: int, username: str, password: str):
+    # 批量操作每条命令的UID数量（兼顾服务器命令行长度限制和单次响应大小）
+    DEFAULT_FETCH_CHUNK_SIZE = 50
+    DEFAULT_STORE_CHUNK_SIZE = 500
+
+    # 超过该大小的邮件内容写入临时文件而非内存
+    DEFAULT_SPOOL_THRESHOLD = 256 * 1024
+
+    # 白名单判断所需的邮件头（不下载正文和附件）
+    GATE_HEADER_FIELDS = ("FROM", "MESSAGE-ID", "SUBJECT", "IN-REPLY-TO")
+
+    # RFC 2177: 服务器可在30分钟无活动后断开，IDLE需在此之前续期
+    IDLE_RENEW_SECONDS = 29 * 60
+    # 等待IDLE续期/DONE应答的超时
+    IDLE_RESPONSE_TIMEOUT = 30
+
+    # 会话保活：套接字超时、无活动多久后发NOOP探测、TCP keepalive参数
+    DEFAULT_SOCKET_TIMEOUT = 60
+    NOOP_INTERVAL = 120
+    TCP_KEEPIDLE = 60
+    TCP_KEEPINTVL = 15
+    TCP_KEEPCNT = 4
+
+    # 重连指数退避（秒）
+    RECONNECT_BACKOFF_BASE = 1
+    RECONNECT_BACKOFF_MAX = 60
+    RECONNECT_ATTEMPTS = 5
+
+    def __init__(
+        self,
+        server: str,
+        port: int,
+        username: str,
+        password: str,
+        folder: str = "INBOX",
+        fetch_chunk_size: int = DEFAULT_FETCH_CHUNK_SIZE,
+        timeout: int = DEFAULT_SOCKET_TIMEOUT,
+        spool_threshold: int = DEFAULT_SPOOL_THRESHOLD
+    ):
         """
         初始化接收器
 
@@ -27,14 +152,35 @@ class EmailReceiver:
             port: IMAP端口
             username: 用户名
             password: 密码/授权码
+            folder: 监听的邮件夹
+            fetch_chunk_size: 批量FETCH每批邮件数
+            timeout: 套接字超时（秒），防止死连接上的读写无限阻塞
+            spool_threshold: 单封邮件内容超过该字节数时写入临时文件
         """
         self.server = server
         self.port = port
         self.username = username
         self.password = password
+        self.folder = folder
+        self.fetch_chunk_size = fetch_chunk_size
+        self.timeout = timeout
+        self.spool_threshold = spool_threshold
         self.client: Optional[imaplib.IMAP4_SSL] = None
+        self.uidvalidity: Optional[int] = None
+        self.uidnext: Optional[int] = None
+        self.highestmodseq: Optional[int] = None
         self._idle_supported = False
         self._connected = False
+        self._last_activity = 0.0
+        self._backoff = 0.0
+        # CONDSTORE/QRESYNC：上次完整同步时的 (UIDVALIDITY, HIGHESTMODSEQ)，
+        # 以及SELECT时服务器报告的变化邮件UID（None表示需要常规搜索）
+        self._sync_hint: Optional[Tuple[int, int]] = None
+        self._resync_uids: Optional[List[int]] = None
+        self._qresync_enabled = False
+        # 用于从信号处理器或其他线程打断IDLE等待
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
 
     def connect(self) -> bool:
         """
@@ -44,8 +190,17 @@ class EmailReceiver:
             连接是否成功
         """
         try:
-            self.client = imaplib.IMAP4_SSL(self.server, self.port)
+            try:
+                self.client = _SpoolingIMAP4_SSL(self.server, self.port, timeout=self.timeout)
+            except TypeError:
+                # Python 3.8 的imaplib不支持timeout参数
+                self.client = _SpoolingIMAP4_SSL(self.server, self.port)
+                self.client.sock.settimeout(self.timeout)
+            self.client.spool_threshold = self.spool_threshold
+            self._enable_tcp_keepalive(self.client.sock)
             self._connected = True
+            self._qresync_enabled = False
+            self._last_activity = time.monotonic()
             logger.info(f"IMAP连接成功: {self.server}:{self.port}")
             return True
         except Exception as e:
@@ -53,6 +208,81 @@ class EmailReceiver:
             self._connected = False
             return False
 
+    def _enable_tcp_keepalive(self, sock: socket.socket) -> None:
+        """启用TCP keepalive，让内核及早发现对端消失的连接"""
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.TCP_KEEPIDLE)
+            elif hasattr(socket, "TCP_KEEPALIVE"):
+                # macOS
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, self.TCP_KEEPIDLE)
+            if hasattr(socket, "TCP_KEEPINTVL"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self.TCP_KEEPINTVL)
+            if hasattr(socket, "TCP_KEEPCNT"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, self.TCP_KEEPCNT)
+        except OSError as e:
+            logger.debug(f"设置TCP keepalive失败: {e}")
+
+    def _mark_broken(self, reason: Exception) -> None:
+        """标记会话已失效，下次操作前会重连"""
+        if self._connected:
+            logger.warning(f"IMAP会话失效: {reason}")
+        self._connected = False
+
+    def _uid(self, command: str, *args):
+        """
+        执行UID命令，连接级错误时标记会话失效
+
+        Raises:
+            imaplib.IMAP4.abort: 连接中断或超时（OSError统一转换）
+        """
+        try:
+            result = self.client.uid(command, *args)
+            self._last_activity = time.monotonic()
+            return result
+        except imaplib.IMAP4.abort as e:
+            self._mark_broken(e)
+            raise
+        except OSError as e:
+            self._mark_broken(e)
+            raise imaplib.IMAP4.abort(str(e)) from e
+
+    def noop(self) -> bool:
+        """
+        发送NOOP探测会话是否存活
+
+        Returns:
+            会话是否存活
+        """
+        if not self.client or not self._connected:
+            return False
+
+        try:
+            status, _ = self.client.noop()
+            if status != "OK":
+                self._mark_broken(imaplib.IMAP4.error(f"NOOP返回 {status}"))
+                return False
+            self._last_activity = time.monotonic()
+            return True
+        except (imaplib.IMAP4.error, OSError) as e:
+            self._mark_broken(e)
+            return False
+
+    def ensure_connected(self) -> bool:
+        """
+        确保会话可用：空闲超过NOOP_INTERVAL时先探测，失效则退避重连
+
+        Returns:
+            会话是否可用
+        """
+        if self._connected and self.client:
+            if time.monotonic() - self._last_activity < self.NOOP_INTERVAL or self.noop():
+                return True
+
+        logger.warning("IMAP连接断开，尝试重连...")
+        return self.reconnect()
+
     def login(self) -> bool:
         """
         登录到邮箱
@@ -66,16 +296,36 @@ class EmailReceiver:
 
         try:
             self.client.login(self.username, self.password)
+            self._refresh_capabilities()
             logger.info(f"IMAP登录成功: {self.username}")
             return True
-        except imaplib.IMAP4.error as e:
+        except (imaplib.IMAP4.error, OSError) as e:
+            # 超时等套接字错误由imaplib原样抛出；未认证的会话不可用，下次操作前重连
             logger.error(f"IMAP登录失败: {e}")
+            self._mark_broken(e)
             return False
 
+    def _refresh_capabilities(self) -> None:
+        """登录后重新获取能力列表（MOVE、UIDPLUS等常在认证后才公布）"""
+        try:
+            status, data = self.client.capability()
+            if status == "OK" and data and data[-1]:
+                self.client.capabilities = tuple(data[-1].decode("ascii", "replace").upper().split())
+        except imaplib.IMAP4.error as e:
+            logger.debug(f"获取服务器能力失败: {e}")
+
+    def has_capability(self, name: str) -> bool:
+        """检查服务器是否公布了某项能力"""
+        return bool(self.client) and name.upper() in self.client.capabilities
+
     def select_inbox(self) -> bool:
         """
         选择收件箱
 
+        服务器支持CONDSTORE时同时获取HIGHESTMODSEQ；支持QRESYNC且有上次同步记录时，
+        由SELECT直接返回此后变化的邮件，重连后无需再搜索。
+        失败时标记会话失效：未选择邮件夹的会话NOOP仍然成功，但所有UID命令都会被拒绝
+
         Returns:
             是否成功
         """
@@ -83,12 +333,90 @@ class EmailReceiver:
             return False
 
         try:
-            self.client.select("INBOX")
+            self._resync_uids = None
+            status, _ = self.client.select(_encode_mailbox(self.folder) + self._select_params())
+            if status != "OK":
+                logger.error(f"选择邮件夹失败: {self.folder}")
+                self._mark_broken(imaplib.IMAP4.error(f"SELECT返回 {status}"))
+                return False
+
+            self.uidvalidity = self._response_int("UIDVALIDITY")
+            self.uidnext = self._response_int("UIDNEXT")
+            self.highestmodseq = self._response_int("HIGHESTMODSEQ")
+            self._collect_resync()
+            logger.info(
+                f"已选择 {self.folder}: UIDVALIDITY={self.uidvalidity}, UIDNEXT={self.uidnext}, "
+                f"HIGHESTMODSEQ={self.highestmodseq}"
+            )
             return True
-        except imaplib.IMAP4.error as e:
+        except (imaplib.IMAP4.error, OSError) as e:
             logger.error(f"选择收件箱失败: {e}")
+            self._mark_broken(e)
             return False
 
+    def set_sync_hint(self, uidvalidity: Optional[int], highestmodseq: Optional[int]) -> None:
+        """
+        记录上次完整同步时的状态，供下次SELECT（含重连）做QRESYNC快速重同步
+
+        Args:
+            uidvalidity: 邮件夹UIDVALIDITY
+            highestmodseq: 同步开始时的HIGHESTMODSEQ
+        """
+        self._sync_hint = (uidvalidity, highestmodseq) if uidvalidity and highestmodseq else None
+
+    def take_resync_uids(self) -> Optional[List[int]]:
+        """
+        取出SELECT时确定的变化邮件UID（只能取一次）
+
+        Returns:
+            自上次同步以来有变化的邮件UID（升序，空列表表示无变化），
+            None表示无法确定，需要常规搜索
+        """
+        uids, self._resync_uids = self._resync_uids, None
+        return uids
+
+    def _select_params(self) -> str:
+        """SELECT的CONDSTORE/QRESYNC参数（RFC 7162）"""
+        if self._sync_hint and self.has_capability("QRESYNC") and self._enable_qresync():
+            return " (QRESYNC ({} {}))".format(*self._sync_hint)
+        if self.has_capability("CONDSTORE"):
+            return " (CONDSTORE)"
+        return ""
+
+    def _enable_qresync(self) -> bool:
+        """在本连接上启用QRESYNC（每个连接一次）"""
+        if not self._qresync_enabled and self.has_capability("ENABLE"):
+            try:
+                status, _ = self.client.enable("QRESYNC")
+                self._qresync_enabled = status == "OK"
+            except imaplib.IMAP4.error as e:
+                logger.debug(f"启用QRESYNC失败: {e}")
+        return self._qresync_enabled
+
+    def _collect_resync(self) -> None:
+        """根据SELECT结果确定变化的邮件（HIGHESTMODSEQ未变 → 无变化；QRESYNC → FETCH响应中的UID）"""
+        # VANISHED（已删除的UID）对收取无影响，直接丢弃
+        self.client.response("VANISHED")
+        _, fetched = self.client.response("FETCH")
+
+        hint = self._sync_hint
+        if not hint or not self.highestmodseq or hint[0] != self.uidvalidity:
+            return
+
+        if self.highestmodseq == hint[1]:
+            self._resync_uids = []
+        elif self._qresync_enabled:
+            uids = set()
+            for item in fetched or []:
+                line = item[0] if isinstance(item, tuple) else item
+                match = _FETCH_UID_RE.search(line or b"")
+                if match:
+                    uids.add(int(match.group(1)))
+            self._resync_uids = sorted(uids)
+        else:
+            return
+        logger.info(f"快速重同步 {self.folder}: MODSEQ {hint[1]} → {self.highestmodseq}, 变化 {len(self._resync_uids)} 封")
+
     def supports_idle(self) -> bool:
         """
         检查服务器是否支持IDLE命令
@@ -99,14 +427,29 @@ class EmailReceiver:
         if not self.client:
             return False
 
-        # 同时检查服务器能力和客户端（imaplib）是否支持IDLE
-        server_supports = "IDLE" in self.client.capabilities
-        client_supports = hasattr(self.client, 'idle')
-        self._idle_supported = server_supports and client_supports
-        logger.info(f"IDLE支持: {self._idle_supported} (服务器={server_supports}, 客户端={client_supports})")
+        # IDLE在原始套接字上自行实现，不依赖imaplib版本，只需服务器支持
+        self._idle_supported = "IDLE" in self.client.capabilities
+        logger.info(f"IDLE支持: {self._idle_supported}")
         return self._idle_supported
 
-    def search_unread(self) -> List[bytes]:
+    def _response_int(self, name: str) -> Optional[int]:
+        """读取并清除SELECT返回的数值型未标记响应（如UIDVALIDITY）"""
+        _, data = self.client.response(name)
+        if not data or data[0] is None:
+            return None
+        try:
+            return int(data[-1])
+        except (TypeError, ValueError):
+            return None
+
+    def _uid_search(self, *criteria: str) -> List[int]:
+        """执行UID SEARCH，返回升序UID列表"""
+        status, messages = self._uid("SEARCH", None, *criteria)
+        if status != "OK" or not messages or not messages[0]:
+            return []
+        return sorted(int(uid) for uid in messages[0].split())
+
+    def search_unread(self) -> List[int]:
         """
         搜索未读邮件
 
@@ -117,15 +460,52 @@ class EmailReceiver:
             return []
 
         try:
-            status, messages = self.client.search(None, "UNSEEN")
-            if status != "OK" or not messages[0]:
-                return []
-            return messages[0].split()
+            return self._uid_search("UNSEEN")
         except imaplib.IMAP4.error as e:
             logger.error(f"搜索邮件失败: {e}")
             return []
 
-    def fetch_email(self, uid: bytes) -> Optional[bytes]:
+    def search_since_uid(self, last_uid: int) -> List[int]:
+        """
+        增量搜索UID大于last_uid的邮件（与已读状态无关）
+
+        Args:
+            last_uid: 已处理的最大UID
+
+        Returns:
+            新邮件UID列表
+        """
+        if not self.client:
+            return []
+
+        try:
+            # "n:*" 在没有更大UID时仍会返回最后一封邮件，需要过滤
+            uids = self._uid_search("UID", f"{last_uid + 1}:*")
+            return [uid for uid in uids if uid > last_uid]
+        except imaplib.IMAP4.error as e:
+            logger.error(f"增量搜索邮件失败: {e}")
+            return []
+
+    def get_highest_uid(self) -> int:
+        """
+        获取当前邮件夹的最大UID（优先使用SELECT返回的UIDNEXT）
+
+        Returns:
+            最大UID，空邮件夹返回0
+        """
+        if self.uidnext:
+            return self.uidnext - 1
+        if not self.client:
+            return 0
+
+        try:
+            uids = self._uid_search("*")
+            return uids[-1] if uids else 0
+        except imaplib.IMAP4.error as e:
+            logger.error(f"获取最大UID失败: {e}")
+            return 0
+
+    def fetch_email(self, uid: Uid) -> Optional[RawEmail]:
         """
         获取邮件内容
 
@@ -133,13 +513,13 @@ class EmailReceiver:
             uid: 邮件UID
 
         Returns:
-            邮件原始字节，失败返回None
+            邮件原始字节（超过spool_threshold时为临时文件），失败返回None
         """
         if not self.client:
             return None
 
         try:
-            status, data = self.client.fetch(uid, "(RFC822)")
+            status, data = self._uid("FETCH", str(int(uid)), "(RFC822)")
             if status != "OK":
                 return None
 
@@ -151,7 +531,189 @@ class EmailReceiver:
             logger.error(f"获取邮件失败: {e}")
             return None
 
-    def mark_as_read(self, uid: bytes) -> bool:
+    @staticmethod
+    def _uid_set(uids: Iterable[Uid]) -> str:
+        """
+        将UID列表压缩为IMAP消息集（连续区间合并为 a:b）
+
+        Args:
+            uids: UID列表
+
+        Returns:
+            消息集字符串，例如 "3:7,10,12:13"
+        """
+        ranges = []
+        for uid in sorted(set(int(u) for u in uids)):
+            if ranges and uid == ranges[-1][1] + 1:
+                ranges[-1][1] = uid
+            else:
+                ranges.append([uid, uid])
+        return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+    @staticmethod
+    def _chunks(uids: List[Uid], size: int) -> Iterator[List[Uid]]:
+        """按固定大小切分UID列表"""
+        for i in range(0, len(uids), size):
+            yield uids[i:i + size]
+
+    def fetch_headers(self, uids: List[Uid]) -> Iterator[Tuple[int, bytes, int]]:
+        """
+        批量只获取白名单判断所需的邮件头和邮件大小（PEEK，不改变已读状态）
+
+        Args:
+            uids: 邮件UID列表
+
+        Yields:
+            (UID, 邮件头字节, 邮件大小)，按UID升序
+
+        Raises:
+            imaplib.IMAP4.error: 某批获取失败
+        """
+        if not self.client:
+            return
+
+        fields = " ".join(self.GATE_HEADER_FIELDS)
+        items = f"(UID RFC822.SIZE BODY.PEEK[HEADER.FIELDS ({fields})])"
+        for chunk in self._chunks(sorted(int(u) for u in uids), self.fetch_chunk_size):
+            status, data = self._uid("FETCH", self._uid_set(chunk), items)
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"批量获取邮件头失败: {status}")
+
+            headers = []
+            for response in data:
+                if not isinstance(response, tuple):
+                    continue
+                uid_match = _FETCH_UID_RE.search(response[0])
+                size_match = _FETCH_SIZE_RE.search(response[0])
+                if uid_match:
+                    size = int(size_match.group(1)) if size_match else 0
+                    headers.append((int(uid_match.group(1)), response[1], size))
+
+            yield from sorted(headers, key=lambda item: item[0])
+
+    def fetch_emails(self, uids: List[Uid], max_bytes: Optional[int] = None) -> Iterator[Tuple[int, RawEmail]]:
+        """
+        批量获取邮件内容，每批一次 UID FETCH 往返
+
+        Args:
+            uids: 邮件UID列表
+            max_bytes: 每封邮件最多下载的字节数（部分获取，正文在前、附件在后，
+                       超出部分的附件会被截断丢弃），None表示下载完整邮件
+
+        Yields:
+            (UID, 邮件原始字节或临时文件)，按UID升序；已被删除的邮件不会返回；
+            超过spool_threshold的邮件为临时文件，由调用方关闭
+
+        Raises:
+            imaplib.IMAP4.error: 某批获取失败（之前的批次已经产出）
+        """
+        if not self.client:
+            return
+
+        item = f"BODY.PEEK[]<0.{int(max_bytes)}>" if max_bytes else "RFC822"
+        for chunk in self._chunks(sorted(int(u) for u in uids), self.fetch_chunk_size):
+            status, data = self._uid("FETCH", self._uid_set(chunk), f"(UID {item})")
+            if status != "OK":
+                raise imaplib.IMAP4.error(f"批量获取邮件失败: {status}")
+
+            messages = []
+            for response in data:
+                if not isinstance(response, tuple):
+                    continue
+                match = _FETCH_UID_RE.search(response[0])
+                if match:
+                    messages.append((int(match.group(1)), response[1]))
+
+            logger.debug(f"批量获取 {len(messages)}/{len(chunk)} 封邮件")
+            yield from sorted(messages, key=lambda item: item[0])
+
+    def mark_as_read_batch(self, uids: List[Uid]) -> bool:
+        """
+        批量标记邮件为已读（每批一次 UID STORE）
+
+        Args:
+            uids: 邮件UID列表
+
+        Returns:
+            是否全部成功
+        """
+        if not self.client or not uids:
+            return not uids
+
+        ok = True
+        for chunk in self._chunks(list(uids), self.DEFAULT_STORE_CHUNK_SIZE):
+            try:
+                status, _ = self._uid("STORE", self._uid_set(chunk), "+FLAGS.SILENT", "(\\Seen)")
+                ok = ok and status == "OK"
+            except imaplib.IMAP4.error as e:
+                logger.error(f"批量标记已读失败: {e}")
+                ok = False
+        return ok
+
+    def move_messages(self, uids: List[Uid], folder: str) -> bool:
+        """
+        批量将邮件移出当前邮件夹（每批一次 UID MOVE，不支持MOVE时用 COPY + 删除标记 + EXPUNGE）
+
+        目标邮件夹不存在时（服务器返回TRYCREATE）自动创建后重试
+
+        Args:
+            uids: 邮件UID列表
+            folder: 目标邮件夹
+
+        Returns:
+            是否全部成功
+        """
+        if not self.client or not uids:
+            return not uids
+
+        mailbox = _encode_mailbox(folder)
+        ok = True
+        for chunk in self._chunks(list(uids), self.DEFAULT_STORE_CHUNK_SIZE):
+            uid_set = self._uid_set(chunk)
+            try:
+                status, data = self._move_chunk(uid_set, mailbox)
+                if status != "OK" and self._needs_create(data) and self._create_mailbox(mailbox):
+                    status, data = self._move_chunk(uid_set, mailbox)
+                if status != "OK":
+                    logger.error(f"移动邮件失败: {uid_set} → {folder}: {data}")
+                    ok = False
+            except imaplib.IMAP4.error as e:
+                logger.error(f"移动邮件失败: {uid_set} → {folder}: {e}")
+                ok = False
+
+        if ok:
+            logger.info(f"已移动 {len(uids)} 封邮件: {self.folder} → {folder}")
+        return ok
+
+    def _move_chunk(self, uid_set: str, mailbox: str) -> Tuple[str, list]:
+        """移动一批邮件，返回MOVE（或COPY）的应答"""
+        if self.has_capability("MOVE"):
+            return self._uid("MOVE", uid_set, mailbox)
+
+        status, data = self._uid("COPY", uid_set, mailbox)
+        if status != "OK":
+            return status, data
+        self._uid("STORE", uid_set, "+FLAGS.SILENT", "(\\Deleted)")
+        if self.has_capability("UIDPLUS"):
+            # 只清除本批邮件，不影响邮件夹中其他带删除标记的邮件
+            self._uid("EXPUNGE", uid_set)
+        else:
+            self.client.expunge()
+        return status, data
+
+    @staticmethod
+    def _needs_create(data: list) -> bool:
+        """应答是否为目标邮件夹不存在（[TRYCREATE]）"""
+        return any(isinstance(item, bytes) and b"[TRYCREATE]" in item.upper() for item in data or [])
+
+    def _create_mailbox(self, mailbox: str) -> bool:
+        """创建目标邮件夹"""
+        status, _ = self.client.create(mailbox)
+        if status == "OK":
+            logger.info(f"已创建邮件夹: {mailbox}")
+        return status == "OK"
+
+    def mark_as_read(self, uid: Uid) -> bool:
         """
         标记邮件为已读
 
@@ -165,50 +727,170 @@ class EmailReceiver:
             return False
 
         try:
-            self.client.store(uid, "+FLAGS", "\\Seen")
+            self._uid("STORE", str(int(uid)), "+FLAGS", "(\\Seen)")
             return True
         except imaplib.IMAP4.error as e:
             logger.error(f"标记已读失败: {e}")
             return False
 
-    def idle_wait(self, timeout: int = 290) -> bool:
+    def idle_wait(self, timeout: int = IDLE_RENEW_SECONDS) -> bool:
         """
-        IDLE模式等待新邮件
+        IDLE模式等待新邮件（RFC 2177，直接在套接字上实现）
+
+        发送IDLE后用select同时等待服务器推送和唤醒信号，收到邮箱变化、
+        超时（最长29分钟，随后由调用方重新进入IDLE实现续期）或被打断时发送DONE退出
 
         Args:
-            timeout: 超时时间（秒）
+            timeout: 超时时间（秒），超过29分钟按29分钟处理
 
         Returns:
-            是否有新邮件
+            是否收到邮箱变化通知
         """
         if not self.client or not self._idle_supported:
             return False
 
+        # 同步期间随命令应答到达的新邮件通知已被imaplib收下，服务器不会再次推送
+        if self._take_pending_events():
+            logger.debug("同步期间有新邮件到达，跳过IDLE")
+            return True
+
+        timeout = min(timeout, self.IDLE_RENEW_SECONDS)
+        sock = self.client.socket()
+        tag = self.client._new_tag()
+        changed = False
+
         try:
-            # 发送IDLE命令
-            self.client.idle()
+            # imaplib缓冲文件中已读入的数据不会触发select，先取出
+            buffer = self._take_buffered(sock)
+            self.client.send(tag + b" IDLE\r\n")
+            while True:
+                line, buffer = self._idle_readline(sock, buffer, self.IDLE_RESPONSE_TIMEOUT)
+                if line is None:
+                    # 服务器可能仍处于IDLE，继续发送命令会与imaplib错位，按会话失效重连
+                    raise imaplib.IMAP4.abort("等待IDLE应答超时")
+                if line.startswith(b"+"):
+                    break
+                if line.upper().startswith(b"* BYE"):
+                    raise imaplib.IMAP4.abort(f"服务器关闭连接: {line!r}")
+                if line.startswith(b"* "):
+                    changed = changed or bool(_IDLE_EVENT_RE.match(line))
+                    continue
+                logger.warning(f"服务器拒绝IDLE: {line!r}")
+                return changed
             logger.debug("进入IDLE模式")
 
-            # 等待服务器推送
-            self.client.idle_check(timeout=timeout)
-
-            # 退出IDLE
-            self.client.idle_done()
-            return True
-        except imaplib.IMAP4.abort:
-            logger.warning("IDLE连接中断")
-            try:
-                self.client.idle_done()
-            except:
-                pass
+            deadline = time.monotonic() + timeout
+            while not changed:
+                line, buffer = self._idle_readline(sock, buffer, deadline - time.monotonic(), interruptible=True)
+                if line is None:
+                    break
+                if line.upper().startswith(b"* BYE"):
+                    raise imaplib.IMAP4.abort(f"服务器关闭连接: {line!r}")
+                if _IDLE_EVENT_RE.match(line):
+                    changed = True
+                    break
+
+            # 退出IDLE，读取到标记应答为止
+            self.client.send(b"DONE\r\n")
+            while True:
+                line, buffer = self._idle_readline(sock, buffer, self.IDLE_RESPONSE_TIMEOUT)
+                if line is None:
+                    raise imaplib.IMAP4.abort("等待IDLE结束应答超时")
+                if line.startswith(tag):
+                    if not line[len(tag):].strip().upper().startswith(b"OK"):
+                        logger.warning(f"IDLE结束异常: {line!r}")
+                    break
+                if _IDLE_EVENT_RE.match(line):
+                    changed = True
+
+            # 标记应答之后已读入的推送（imaplib不会再看到这些数据）
+            for line in buffer.split(b"\r\n"):
+                if _IDLE_EVENT_RE.match(line):
+                    changed = True
+            self._last_activity = time.monotonic()
+            return changed
+        except (OSError, imaplib.IMAP4.abort) as e:
+            self._mark_broken(e)
             return False
-        except Exception as e:
-            logger.warning(f"IDLE等待失败: {e}")
-            try:
-                self.client.idle_done()
-            except:
+        finally:
+            self.client.tagged_commands.pop(tag, None)
+
+    def _take_pending_events(self) -> bool:
+        """取出imaplib已收下的新邮件通知（EXISTS/RECENT），返回是否有"""
+        pending = False
+        for name in ("EXISTS", "RECENT"):
+            if self.client.untagged_responses.pop(name, None):
+                pending = True
+        return pending
+
+    def _take_buffered(self, sock: socket.socket) -> bytes:
+        """不阻塞地取出imaplib缓冲文件中已读入但未消费的数据"""
+        timeout = sock.gettimeout()
+        try:
+            sock.setblocking(False)
+            return self.client.file.read1(65536) or b""
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return b""
+        finally:
+            sock.settimeout(timeout)
+
+    def _idle_readline(
+        self,
+        sock: socket.socket,
+        buffer: bytes,
+        timeout: float,
+        interruptible: bool = False
+    ) -> Tuple[Optional[bytes], bytes]:
+        """
+        从套接字读取一行IMAP响应
+
+        Args:
+            sock: IMAP套接字
+            buffer: 已读取但未消费的数据
+            timeout: 超时（秒）
+            interruptible: 是否响应 interrupt_idle() 唤醒
+
+        Returns:
+            (一行响应（不含CRLF），剩余数据)，超时或被打断时行为None
+        """
+        deadline = time.monotonic() + max(timeout, 0)
+        while b"\r\n" not in buffer:
+            # SSL层已解密但未读取的数据不会触发select
+            pending = sock.pending() if hasattr(sock, "pending") else 0
+            if not pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, buffer
+                watch = [sock, self._wakeup_r] if interruptible else [sock]
+                readable, _, _ = select.select(watch, [], [], remaining)
+                if not readable:
+                    return None, buffer
+                if self._wakeup_r in readable:
+                    self._drain_wakeup()
+                    return None, buffer
+
+            data = sock.recv(4096)
+            if not data:
+                raise imaplib.IMAP4.abort("连接已关闭")
+            buffer += data
+
+        line, _, rest = buffer.partition(b"\r\n")
+        return line, rest
+
+    def _drain_wakeup(self) -> None:
+        """清空唤醒信号"""
+        try:
+            while self._wakeup_r.recv(64):
                 pass
-            return False
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def interrupt_idle(self) -> None:
+        """打断正在进行的IDLE等待（可在信号处理器或其他线程中调用）"""
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass
 
     def poll_wait(self, interval: int = 30) -> bool:
         """
@@ -221,20 +903,36 @@ class EmailReceiver:
             True（总是返回，表示轮询完成）
         """
         logger.debug(f"轮询等待 {interval} 秒")
-        time.sleep(interval)
+        self._sleep(interval)
         return True
 
+    def _sleep(self, seconds: float) -> bool:
+        """
+        可被 interrupt_idle() 打断的休眠
+
+        Returns:
+            是否被打断
+        """
+        readable, _, _ = select.select([self._wakeup_r], [], [], max(seconds, 0))
+        if readable:
+            self._drain_wakeup()
+            return True
+        return False
+
     def disconnect(self) -> bool:
         """
-        断开连接
+        断开连接（会话已失效时直接关闭套接字，不再发送CLOSE/LOGOUT）
 
         Returns:
             是否成功
         """
         if self.client:
             try:
-                self.client.close()
-                self.client.logout()
+                if self._connected:
+                    self.client.close()
+                    self.client.logout()
+                else:
+                    self.client.shutdown()
             except:
                 pass
             finally:
@@ -242,25 +940,48 @@ class EmailReceiver:
                 self._connected = False
         return True
 
-    def reconnect(self) -> bool:
+    def reconnect(self, max_attempts: int = RECONNECT_ATTEMPTS) -> bool:
         """
-        重新连接
+        指数退避重连并恢复会话状态（登录、选择邮件夹、IDLE能力）
+
+        退避时长在多次调用间累积，成功后归零；退避等待可被 interrupt_idle() 打断
+
+        Args:
+            max_attempts: 本次最多尝试次数
 
         Returns:
             是否成功
         """
-        self.disconnect()
-        time.sleep(1)
+        previous_uidvalidity = self.uidvalidity
 
-        if not self.connect():
-            return False
-        if not self.login():
-            return False
-        if not self.select_inbox():
-            return False
+        for attempt in range(1, max_attempts + 1):
+            if self._backoff:
+                delay = self._backoff * random.uniform(0.8, 1.2)
+                logger.info(f"{delay:.1f} 秒后重连IMAP（第 {attempt}/{max_attempts} 次）")
+                if self._sleep(delay):
+                    return False
 
-        self.supports_idle()
-        return True
+            self.disconnect()
+            try:
+                if self.connect() and self.login() and self.select_inbox():
+                    self.supports_idle()
+                    self._backoff = 0.0
+                    if previous_uidvalidity and self.uidvalidity != previous_uidvalidity:
+                        logger.warning(f"重连后UIDVALIDITY变化: {previous_uidvalidity} → {self.uidvalidity}")
+                    logger.info("IMAP重连成功")
+                    return True
+            except Exception as e:
+                # 任何意外异常都计为一次失败的尝试，不能留下半建立的会话
+                logger.error(f"IMAP重连出错: {e}")
+
+            self._connected = False
+            self._backoff = min(
+                max(self._backoff * 2, self.RECONNECT_BACKOFF_BASE),
+                self.RECONNECT_BACKOFF_MAX
+            )
+
+        logger.error(f"IMAP重连失败（{max_attempts} 次）")
+        return False
 
     def __enter__(self):
         """上下文管理器入口"""
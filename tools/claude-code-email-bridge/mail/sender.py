@@ -1,19 +1,24 @@
 #!/usr/bin/env python3
 """
 SMTP邮件发送器
-支持SSL/TLS加密、长内容截断、附件
+支持SSL/TLS加密、长内容截断、附件、按服务商限速和会话复用
 """
 
 import smtplib
 import email
 import logging
+import tempfile
 import time
+import zipfile
+from email.message import Message
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
+from .ratelimit import get_bucket, provider_limits
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,8 +27,25 @@ class EmailSender:
 
     # 长内容截断阈值
     MAX_BODY_LENGTH = 50000
-
-    def __init__(self, server: str, port: int, username: str, password: str):
+    # 完整内容附件：分块编码写入磁盘上的zip临时文件，内存中只保留压缩后的数据
+    ATTACHMENT_CHUNK_CHARS = 64 * 1024
+
+    # 会话保活：套接字超时、空闲多久后发送前先NOOP探测、空闲多久直接重建会话
+    # （服务器通常在几分钟无活动后静默断开，过期会话上的NOOP也可能卡到超时）
+    DEFAULT_TIMEOUT = 30
+    NOOP_INTERVAL = 60
+    IDLE_RECYCLE_SECONDS = 300
+    # 连接级错误时发送的最多尝试次数（每次都会重连）
+    SEND_ATTEMPTS = 2
+
+    def __init__(
+        self,
+        server: str,
+        port: int,
+        username: str,
+        password: str,
+        rate_limit: Optional[dict] = None
+    ):
         """
         初始化发送器
 
@@ -32,6 +54,7 @@ class EmailSender:
             port: SMTP端口
             username: 用户名
             password: 密码/授权码
+            rate_limit: 覆盖服务商默认限制（per_minute、burst、per_session）
         """
         self.server = server
         self.port = port
@@ -39,6 +62,12 @@ class EmailSender:
         self.password = password
         self.client: Optional[smtplib.SMTP_SSL] = None
         self._connected = False
+        self._last_activity = 0.0
+
+        # 同一服务商的发送器共享令牌桶；一个已认证会话连续发送多封，达到上限后重建
+        self.limits = provider_limits(server, rate_limit)
+        self._bucket = get_bucket(server, self.limits["per_minute"], self.limits["burst"])
+        self._session_messages = 0
 
     def connect(self) -> bool:
         """
@@ -48,8 +77,10 @@ class EmailSender:
             连接是否成功
         """
         try:
-            self.client = smtplib.SMTP_SSL(self.server, self.port, timeout=30)
+            self.client = smtplib.SMTP_SSL(self.server, self.port, timeout=self.DEFAULT_TIMEOUT)
             self._connected = True
+            self._last_activity = time.monotonic()
+            self._session_messages = 0
             logger.info(f"SMTP连接成功: {self.server}:{self.port}")
             return True
         except Exception as e:
@@ -70,11 +101,95 @@ class EmailSender:
 
         try:
             self.client.login(self.username, self.password)
+            self._last_activity = time.monotonic()
             logger.info(f"SMTP登录成功: {self.username}")
             return True
         except smtplib.SMTPAuthenticationError as e:
             logger.error(f"SMTP认证失败: {e}")
             return False
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error(f"SMTP登录失败: {e}")
+            self._connected = False
+            return False
+
+    def _mark_broken(self, reason: Exception) -> None:
+        """标记会话已失效，下次发送前会重连"""
+        if self._connected:
+            logger.warning(f"SMTP会话失效: {reason}")
+        self._connected = False
+
+    def noop(self) -> bool:
+        """
+        发送NOOP探测会话是否存活
+
+        Returns:
+            会话是否存活
+        """
+        if not self.client or not self._connected:
+            return False
+
+        try:
+            code, _ = self.client.noop()
+            if code != 250:
+                self._mark_broken(smtplib.SMTPResponseException(code, "NOOP失败"))
+                return False
+            self._last_activity = time.monotonic()
+            return True
+        except (smtplib.SMTPException, OSError) as e:
+            self._mark_broken(e)
+            return False
+
+    def ensure_connected(self) -> bool:
+        """
+        确保会话可用：单个会话发送数达到服务商上限或空闲过久直接重建会话，
+        空闲较久先NOOP探测，失效则重连
+
+        Returns:
+            会话是否可用
+        """
+        per_session = self.limits["per_session"]
+        if self.client and self._connected and per_session and self._session_messages >= per_session:
+            logger.info(f"SMTP会话已发送 {self._session_messages} 封，重建会话")
+        elif self.client and self._connected:
+            idle = time.monotonic() - self._last_activity
+            if idle < self.NOOP_INTERVAL:
+                return True
+            if idle < self.IDLE_RECYCLE_SECONDS and self.noop():
+                return True
+            if idle >= self.IDLE_RECYCLE_SECONDS:
+                logger.info(f"SMTP会话空闲 {idle:.0f} 秒，重建会话")
+
+        return self.reconnect()
+
+    @staticmethod
+    def _is_connection_error(error: Exception) -> bool:
+        """是否为可通过重连恢复的错误（断线、超时、421服务不可用）"""
+        if isinstance(error, (smtplib.SMTPServerDisconnected, OSError)):
+            return True
+        return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code == 421
+
+    def _deliver(self, msg: Message) -> None:
+        """
+        发送已构建的邮件，连接级错误时透明重连重试
+
+        Raises:
+            smtplib.SMTPException: 发送失败（非连接错误，或重试后仍失败）
+        """
+        for attempt in range(1, self.SEND_ATTEMPTS + 1):
+            if not self.ensure_connected():
+                raise smtplib.SMTPServerDisconnected("SMTP重连失败")
+            try:
+                self.client.send_message(msg)
+                self._last_activity = time.monotonic()
+                self._session_messages += 1
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                if not self._is_connection_error(e):
+                    raise
+                self._mark_broken(e)
+                if attempt == self.SEND_ATTEMPTS:
+                    raise smtplib.SMTPServerDisconnected(str(e)) from e
+                logger.warning(f"SMTP发送中断，重连后重试: {e}")
 
     def send_email(
         self,
@@ -82,7 +197,8 @@ class EmailSender:
         subject: str,
         body: str,
         html: bool = False,
-        original_message_id: Optional[str] = None
+        original_message_id: Optional[str] = None,
+        references: Optional[List[str]] = None
     ) -> bool:
         """
         发送邮件
@@ -93,20 +209,24 @@ class EmailSender:
             body: 邮件正文
             html: 是否为HTML格式
             original_message_id: 原始邮件ID（用于回复）
+            references: 同一线程中的全部邮件ID（摘要邮件），缺省为原始邮件ID
 
         Returns:
             发送是否成功
         """
-        if not self.client or not self._connected:
-            logger.error("未连接到服务器")
-            return False
-
         try:
             # 处理长内容
             content, is_truncated = self._prepare_content(body)
 
-            # 构建邮件
-            msg = MIMEMultipart()
+            # 构建邮件：内容未截断时只有单个正文部分，截断时附加压缩后的完整内容
+            subtype = "html" if html else "plain"
+            text_part = MIMEText(content, subtype, "utf-8")
+            if is_truncated:
+                msg = MIMEMultipart()
+                msg.attach(text_part)
+                msg.attach(self._build_attachment(body))
+            else:
+                msg = text_part
             msg["From"] = self.username
             msg["To"] = to
             msg["Subject"] = subject
@@ -115,21 +235,13 @@ class EmailSender:
             # 设置回复头
             if original_message_id:
                 msg["In-Reply-To"] = original_message_id
-                msg["References"] = original_message_id
-
-            # 添加正文
-            subtype = "html" if html else "plain"
-            msg.attach(MIMEText(content, subtype, "utf-8"))
+                msg["References"] = " ".join(references) if references else original_message_id
 
-            # 如果内容被截断，添加完整附件
-            if is_truncated:
-                attachment = MIMEApplication(body.encode("utf-8"))
-                filename = f"claude_output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-                attachment.add_header("Content-Disposition", "attachment", filename=filename)
-                msg.attach(attachment)
-
-            # 发送
-            self.client.send_message(msg)
+            # 按服务商限速后发送（会话失效时自动重连重试）
+            waited = self._bucket.acquire()
+            if waited > 1:
+                logger.debug(f"SMTP限速等待 {waited:.1f} 秒: {self.server}")
+            self._deliver(msg)
             logger.info(f"邮件发送成功: to={to}, subject={subject[:30]}...")
             return True
 
@@ -143,7 +255,8 @@ class EmailSender:
         subject: str,
         body: str,
         original_message_id: str,
-        html: bool = False
+        html: bool = False,
+        references: Optional[List[str]] = None
     ) -> bool:
         """
         回复邮件
@@ -154,6 +267,7 @@ class EmailSender:
             body: 回复正文
             original_message_id: 原始邮件ID
             html: 是否为HTML格式
+            references: 同一线程中的全部邮件ID
 
         Returns:
             发送是否成功
@@ -162,7 +276,31 @@ class EmailSender:
         if not subject.startswith("Re:") and not subject.startswith("RE:"):
             subject = f"Re: {subject}"
 
-        return self.send_email(to, subject, body, html, original_message_id)
+        return self.send_email(to, subject, body, html, original_message_id, references)
+
+    def _build_attachment(self, content: str) -> MIMEApplication:
+        """
+        构建完整内容的zip附件（不在内存中生成完整的编码副本）
+
+        Args:
+            content: 完整内容
+
+        Returns:
+            附件部分
+        """
+        filename = f"claude_output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        step = self.ATTACHMENT_CHUNK_CHARS
+
+        with tempfile.TemporaryFile() as spool:
+            with zipfile.ZipFile(spool, "w", zipfile.ZIP_DEFLATED) as archive:
+                with archive.open(filename, "w") as entry:
+                    for start in range(0, len(content), step):
+                        entry.write(content[start:start + step].encode("utf-8"))
+            spool.seek(0)
+            attachment = MIMEApplication(spool.read(), "zip")
+
+        attachment.add_header("Content-Disposition", "attachment", filename=f"{filename}.zip")
+        return attachment
 
     def _prepare_content(self, content: str) -> tuple:
         """
@@ -180,7 +318,7 @@ class EmailSender:
             body = content[:self.MAX_BODY_LENGTH]
             footer = f"\n\n{'=' * 60}\n"
             footer += f"⚠️ 内容已截断 ({len(content)} 字符 → {self.MAX_BODY_LENGTH} 字符)\n"
-            footer += f"📎 完整内容见附件\n"
+            footer += f"📎 完整内容见附件（zip压缩）\n"
             footer += f"📅 发送时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
             return body + footer, True
 
@@ -195,7 +333,10 @@ class EmailSender:
         """
         if self.client:
             try:
-                self.client.quit()
+                if self._connected:
+                    self.client.quit()
+                else:
+                    self.client.close()
             except:
                 pass
             finally:
@@ -211,7 +352,6 @@ class EmailSender:
             是否成功
         """
         self.disconnect()
-        time.sleep(1)
 
         if not self.connect():
             return False
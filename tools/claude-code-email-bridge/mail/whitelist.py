@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+发件人白名单匹配器
+构建时预编译：精确地址放入哈希集合，域名规则放入反转域名前缀树，单次判断与条目数量无关
+"""
+
+import logging
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _DomainNode:
+    """反转域名前缀树节点（com → example → mail）"""
+
+    __slots__ = ("children", "exact", "wildcard")
+
+    def __init__(self):
+        self.children: Dict[str, "_DomainNode"] = {}
+        # 该域名本身在白名单中（@example.com）
+        self.exact = False
+        # 该域名的所有子域名在白名单中（*.example.com）
+        self.wildcard = False
+
+
+class WhitelistMatcher:
+    """
+    白名单匹配器（构建后只读，更新时整体重建替换）
+
+    支持的条目格式（不区分大小写）：
+        alice@example.com      精确地址
+        @example.com           该域名下的所有地址（不含子域名）
+        example.com            同上
+        *.example.com          所有子域名下的地址（如 a@mail.example.com）
+        @*.example.com         同上
+    """
+
+    def __init__(self, entries: Iterable[str]):
+        """
+        构建匹配器
+
+        Args:
+            entries: 白名单条目
+        """
+        self._addresses = set()
+        self._root = _DomainNode()
+        self._size = 0
+
+        for entry in entries:
+            if self._add(entry):
+                self._size += 1
+            elif entry.strip():
+                logger.warning(f"无效的白名单条目，已忽略: {entry!r}")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _add(self, entry: str) -> bool:
+        """添加一条规则，返回是否有效"""
+        rule = entry.strip().lower()
+        if not rule:
+            return False
+
+        local, at, domain = rule.rpartition("@")
+        if at and local:
+            self._addresses.add(rule)
+            return True
+
+        wildcard = domain.startswith("*.")
+        if wildcard:
+            domain = domain[2:]
+        labels = self._labels(domain)
+        if not labels:
+            return False
+
+        node = self._root
+        for label in labels:
+            node = node.children.setdefault(label, _DomainNode())
+        if wildcard:
+            node.wildcard = True
+        else:
+            node.exact = True
+        return True
+
+    @staticmethod
+    def _labels(domain: str) -> Optional[list]:
+        """域名拆分为反转的标签列表（example.com → ["com", "example"]）"""
+        labels = domain.strip(".").split(".")
+        if not all(labels):
+            return None
+        labels.reverse()
+        return labels
+
+    def matches(self, sender: str) -> bool:
+        """
+        检查发件人地址是否匹配
+
+        Args:
+            sender: 发件人邮箱地址
+
+        Returns:
+            是否匹配
+        """
+        address = sender.strip().lower()
+        if address in self._addresses:
+            return True
+
+        local, at, domain = address.rpartition("@")
+        if not at or not local:
+            return False
+        labels = self._labels(domain)
+        if not labels:
+            return False
+
+        node = self._root
+        for depth, label in enumerate(labels):
+            node = node.children.get(label)
+            if node is None:
+                return False
+            if node.wildcard and depth < len(labels) - 1:
+                return True
+        return node.exact
@@ -4,22 +4,30 @@
 监听邮件 → 解析命令 → 执行Claude → 发送结果
 """
 
+import argparse
 import signal
 import sys
 import logging
+import threading
 import time
 import os
 from pathlib import Path
+from typing import Dict, List, Optional
 
 # 添加模块路径
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config.settings import get_settings
+from mail.parse_pool import ParsePool
 from mail.parser import EmailParser
-from mail.receiver import EmailReceiver
+from mail.receiver import EmailReceiver, RawEmail
 from mail.sender import EmailSender
+from queue.archive import CommandArchiver
 from queue.manager import CommandQueue
+from queue.outbox import OutboxDispatcher
+from queue.retention import RetentionScheduler
 from core.executor import ClaudeExecutor
+from core.router import CommandRouter
 
 # 配置日志
 logging.basicConfig(
@@ -36,40 +44,107 @@ logger = logging.getLogger(__name__)
 class EmailCommandApp:
     """邮件命令应用"""
 
-    def __init__(self):
-        """初始化应用"""
+    # 运行角色：all=单进程收取+执行，intake=只收取入队，worker=只执行
+    ROLE_ALL = "all"
+    ROLE_INTAKE = "intake"
+    ROLE_WORKER = "worker"
+    ROLES = (ROLE_ALL, ROLE_INTAKE, ROLE_WORKER)
+
+    # 邮件处理结果（决定移入哪个邮件夹）
+    OUTCOME_PROCESSED = "processed"
+    OUTCOME_REJECTED = "rejected"
+    OUTCOME_FAILED = "failed"
+    # 处理失败的邮件保持未读，最多再重试的轮数
+    MAX_MESSAGE_RETRIES = 3
+
+    def __init__(self, role: str = ROLE_ALL):
+        """
+        初始化应用
+
+        Args:
+            role: 运行角色（all/intake/worker）
+        """
         self.settings = get_settings()
+        self.role = role
         self.running = False
         self.shutdown_requested = False
 
         # 初始化组件
         self.queue = CommandQueue(self.settings.get_db_path())
+        archive_dir = self.settings.get_archive_dir()
+        self.retention = RetentionScheduler(
+            self.queue,
+            days=self.settings.get_retention_days(),
+            max_db_bytes=self.settings.get_retention_max_db_bytes(),
+            interval=self.settings.get_retention_interval(),
+            archiver=CommandArchiver(self.queue, archive_dir) if archive_dir else None
+        )
+        # 大批量邮件的正文解析分发到子进程
+        self.parse_pool = ParsePool(
+            workers=self.settings.get_parse_pool_workers(),
+            threshold=self.settings.get_parse_pool_threshold(),
+            parser_options={"max_command_length": self.settings.get_max_command_length()}
+        )
         self.executor = ClaudeExecutor(
             output_file=Path(self.settings.get_output_file()),
             timeout=self.settings.get_claude_timeout()
         )
         self.executor.set_project_dir(self.settings.get_project_dir())
-
-        # 获取配置
-        imap_config = self.settings.get_imap_config()
-        smtp_config = self.settings.get_smtp_config()
-
-        # 初始化邮件组件（稍后连接）
-        self.receiver = EmailReceiver(
-            server=imap_config["server"],
-            port=imap_config["port"],
-            username=imap_config["username"],
-            password=imap_config["password"]
-        )
-
-        self.sender = EmailSender(
-            server=smtp_config["server"],
-            port=smtp_config["port"],
-            username=smtp_config["username"],
-            password=smtp_config["password"]
-        )
-
-        self.parser = EmailParser(whitelist=self.settings.get_whitelist())
+        # 管理命令和历史搜索在入队前直接从数据库回答
+        self.router = CommandRouter(self.queue)
+
+        # 初始化邮件组件（稍后连接）：每个账号一个SMTP发送器和解析器，
+        # 每个账号的每个邮件夹一个IMAP连接（各自IDLE）
+        self.receivers: List[EmailReceiver] = []
+        self.senders: Dict[str, EmailSender] = {}
+        self.parsers: Dict[str, EmailParser] = {}
+        self.move_folders: Dict[str, Dict[str, str]] = {}
+
+        rate_limit = self.settings.get_smtp_rate_limit()
+        for account in self.settings.get_mail_accounts():
+            username = account["username"]
+            self.senders[username] = EmailSender(
+                server=account["smtp_server"],
+                port=account["smtp_port"],
+                username=username,
+                password=account["password"],
+                rate_limit=rate_limit
+            )
+            self.parsers[username] = EmailParser(
+                whitelist=account["whitelist"],
+                max_command_length=self.settings.get_max_command_length()
+            )
+            self.move_folders[username] = {
+                self.OUTCOME_PROCESSED: account.get("processed_folder", ""),
+                self.OUTCOME_REJECTED: account.get("rejected_folder", ""),
+                self.OUTCOME_FAILED: account.get("failed_folder", ""),
+            }
+            for folder in account["folders"]:
+                self.receivers.append(EmailReceiver(
+                    server=account["imap_server"],
+                    port=account["imap_port"],
+                    username=username,
+                    password=account["password"],
+                    folder=folder,
+                    fetch_chunk_size=account["fetch_chunk_size"],
+                    timeout=account["timeout"]
+                ))
+
+        # 主账号（无账号信息的命令使用主账号回复）
+        primary = next(iter(self.senders))
+        self.sender = self.senders[primary]
+        self.parser = self.parsers[primary]
+
+        # 回复由后台线程从发件箱发送，执行和收取都不等待SMTP；
+        # 摘要模式下命令结果延迟一个窗口发送，窗口内同一收件人的结果合并为一封。
+        # 限速令牌桶和SMTP会话是进程内的，只由收取进程（all/intake）发送，
+        # 工作进程只写入发件箱，避免多个进程各自按上限发送；
+        # 保留策略（清理/归档）同样只在该进程运行，多个归档器并发会重复写入分段并互相覆盖索引
+        self.sends_replies = role != self.ROLE_WORKER
+        self.digest_window = self.settings.get_digest_window()
+        self.outbox = OutboxDispatcher(self.queue, self._send_outbox, digest_window=self.digest_window)
+
+        self._intake_threads: List[threading.Thread] = []
 
         # 设置信号处理
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -79,13 +154,20 @@ class EmailCommandApp:
         """信号处理器"""
         logger.info(f"收到信号 {signum}，准备优雅停机...")
         self.shutdown_requested = True
+        self.queue.notifier.interrupt()
+        for receiver in self.receivers:
+            receiver.interrupt_idle()
 
     def start(self):
         """启动应用"""
         logger.info("=" * 60)
-        logger.info("邮件双向通信系统启动")
+        logger.info(f"邮件双向通信系统启动 (role={self.role})")
         logger.info("=" * 60)
 
+        # 执行者在首次出队前绑定唤醒通道，避免丢失通知
+        if self.role != self.ROLE_INTAKE:
+            self.queue.notifier.listen()
+
         # 连接邮件服务
         if not self._connect_email_services():
             logger.error("邮件服务连接失败，退出")
@@ -96,7 +178,16 @@ class EmailCommandApp:
         if stuck_count > 0:
             logger.info(f"重置了 {stuck_count} 个卡住的命令")
 
+        # 启动后台清理和回复投递
+        if self.sends_replies:
+            self.retention.start()
+            self.outbox.start()
+
         self.running = True
+
+        # 每个邮件夹一个收取线程，共享同一个命令队列
+        if self.role != self.ROLE_WORKER:
+            self._start_intake_threads()
         logger.info("系统启动完成，开始监听邮件...")
 
         # 主循环
@@ -109,114 +200,366 @@ class EmailCommandApp:
             self._shutdown()
 
     def _connect_email_services(self) -> bool:
-        """连接邮件服务"""
-        # IMAP连接
-        if not self.receiver.connect():
-            logger.error("IMAP连接失败")
-            return False
-        if not self.receiver.login():
-            logger.error("IMAP登录失败")
-            return False
-        if not self.receiver.select_inbox():
-            logger.error("选择收件箱失败")
-            return False
+        """
+        连接邮件服务
 
-        idle_supported = self.receiver.supports_idle()
-        logger.info(f"IDLE模式: {'支持' if idle_supported else '不支持（将使用轮询）'}")
+        主账号SMTP必须可用；IMAP只要有一个邮件夹连接成功即可启动，
+        其余邮件夹由各自的收取线程退避重连
+        """
+        # 工作进程只执行命令、写入发件箱，不需要邮件连接
+        if self.role == self.ROLE_WORKER:
+            return True
+
+        connected = [receiver for receiver in self.receivers if self._connect_imap(receiver)]
+        if not connected:
+            return False
 
         # SMTP连接
-        if not self.sender.connect():
-            logger.error("SMTP连接失败")
+        for username, sender in self.senders.items():
+            if sender.connect() and sender.login():
+                continue
+            logger.error(f"SMTP连接失败: {username}")
+            if sender is self.sender:
+                return False
+
+        return True
+
+    def _connect_imap(self, receiver: EmailReceiver) -> bool:
+        """连接IMAP服务"""
+        name = f"{receiver.username}/{receiver.folder}"
+        state = self.queue.get_sync_state(receiver.username, receiver.folder)
+        if state:
+            receiver.set_sync_hint(state["uidvalidity"], state["highestmodseq"])
+
+        if not receiver.connect():
+            logger.error(f"IMAP连接失败: {name}")
+            return False
+        if not receiver.login():
+            logger.error(f"IMAP登录失败: {name}")
             return False
-        if not self.sender.login():
-            logger.error("SMTP登录失败")
+        if not receiver.select_inbox():
+            logger.error(f"选择邮件夹失败: {name}")
             return False
 
+        idle_supported = receiver.supports_idle()
+        logger.info(f"IDLE模式 {name}: {'支持' if idle_supported else '不支持（将使用轮询）'}")
         return True
 
-    def _loop_iteration(self):
-        """单次循环迭代"""
-        try:
-            # 1. 接收新邮件
-            self._receive_emails()
+    def _start_intake_threads(self):
+        """为每个邮件夹启动收取线程"""
+        for receiver in self.receivers:
+            thread = threading.Thread(
+                target=self._intake_loop,
+                args=(receiver,),
+                name=f"intake-{receiver.username}/{receiver.folder}",
+                daemon=True
+            )
+            thread.start()
+            self._intake_threads.append(thread)
+
+    def _intake_loop(self, receiver: EmailReceiver):
+        """
+        收取线程主循环：接收新邮件入队，然后IDLE（或轮询）等待
 
-            # 2. 处理队列
-            self._process_queue()
+        Args:
+            receiver: 本线程负责的邮件夹接收器
+        """
+        while not self.shutdown_requested:
+            try:
+                self._receive_emails(receiver)
+
+                if self.shutdown_requested:
+                    break
+                if receiver._idle_supported and receiver._connected:
+                    receiver.idle_wait()
+                else:
+                    receiver.poll_wait(interval=self.settings.get_polling_interval())
 
-            # 3. 等待（IDLE或轮询）
-            if self.receiver._idle_supported and not self.shutdown_requested:
-                self.receiver.idle_wait(timeout=290)
-            else:
-                self.receiver.poll_wait(interval=self.settings.get_polling_interval())
+            except Exception as e:
+                logger.error(f"收取线程异常 {receiver.username}/{receiver.folder}: {e}", exc_info=True)
+                receiver.poll_wait(interval=10)
 
-            # 4. 定期清理（每小时）
-            if int(time.time()) % 3600 < 30:
-                self.queue.delete_old_completed(days=7)
+    def _loop_iteration(self):
+        """主线程单次循环迭代（收取在独立线程中进行）"""
+        try:
+            if self.role == self.ROLE_INTAKE:
+                time.sleep(1)
+                return
+
+            self._worker_iteration()
 
         except Exception as e:
             logger.error(f"循环迭代异常: {e}", exc_info=True)
             time.sleep(10)
 
-    def _receive_emails(self):
-        """接收邮件并加入队列"""
+    def _worker_iteration(self):
+        """执行迭代：清空队列后阻塞等待入队通知"""
+        while not self.shutdown_requested and self._process_queue():
+            pass
+
+        if not self.shutdown_requested:
+            self.queue.wait_for_work(timeout=self.settings.get_polling_interval())
+
+    def _receive_emails(self, receiver: EmailReceiver):
+        """
+        接收邮件并加入队列
+
+        Args:
+            receiver: 邮件夹接收器
+        """
         try:
-            # 检查连接状态，必要时重连
-            if not self.receiver._connected:
-                logger.warning("IMAP连接断开，尝试重连...")
-                if not self.receiver.reconnect():
-                    return
+            # 检查会话存活（空闲时NOOP探测），必要时退避重连
+            if not receiver.ensure_connected():
+                return
+
+            # 增量搜索新邮件
+            new_uids = self._find_new_uids(receiver)
+            logger.debug(f"发现 {len(new_uids)} 封新邮件: {receiver.username}/{receiver.folder}")
+
+            # 分批处理；某批失败时异常中止，下次从未处理的UID继续
+            outcomes = {self.OUTCOME_PROCESSED: [], self.OUTCOME_REJECTED: [], self.OUTCOME_FAILED: []}
+            attempted = set()
+            try:
+                for i in range(0, len(new_uids), receiver.fetch_chunk_size):
+                    chunk = new_uids[i:i + receiver.fetch_chunk_size]
+                    self._receive_chunk(receiver, chunk, outcomes)
+                    attempted.update(chunk)
+            finally:
+                self._finish_batch(receiver, outcomes)
+                self._save_retries(receiver, outcomes[self.OUTCOME_FAILED], attempted)
+
+            # 本轮已完整处理，记录SELECT时的HIGHESTMODSEQ，重连时只需同步此后的变化
+            if receiver.highestmodseq and receiver.uidvalidity:
+                self.queue.save_sync_modseq(
+                    receiver.username, receiver.folder, receiver.uidvalidity, receiver.highestmodseq
+                )
+                receiver.set_sync_hint(receiver.uidvalidity, receiver.highestmodseq)
+
+        except Exception as e:
+            logger.error(f"接收邮件失败: {e}")
+
+    def _finish_batch(self, receiver: EmailReceiver, outcomes: Dict[str, list]):
+        """
+        批量收尾：一次标记已读，再按处理结果分组移入配置的邮件夹
+
+        Args:
+            receiver: 邮件夹接收器
+            outcomes: 处理结果 → UID列表
+        """
+        handled = outcomes[self.OUTCOME_PROCESSED] + outcomes[self.OUTCOME_REJECTED]
+        receiver.mark_as_read_batch(handled)
+
+        for outcome, uids in outcomes.items():
+            target = self.move_folders[receiver.username].get(outcome)
+            if uids and target and target != receiver.folder:
+                receiver.move_messages(uids, target)
+
+    def _save_retries(self, receiver: EmailReceiver, failed: list, attempted: set):
+        """
+        记录处理失败的UID：同步水位已越过这些邮件，下一轮按记录重新下载处理，超过次数后放弃
+
+        Args:
+            receiver: 邮件夹接收器
+            failed: 本轮处理失败的UID
+            attempted: 本轮已完整处理过的UID（其中未再失败的从重试记录中移除）
+        """
+        uidvalidity = receiver.uidvalidity or 0
+        previous = self.queue.get_sync_retries(receiver.username, receiver.folder, uidvalidity)
+        if not failed and not previous:
+            return
+
+        done = attempted.union(failed)
+        retries = {uid: attempts for uid, attempts in previous.items() if uid not in done}
+
+        # 失败邮件已移入其他邮件夹时无法在本邮件夹重试
+        target = self.move_folders[receiver.username].get(self.OUTCOME_FAILED)
+        if not (target and target != receiver.folder):
+            for uid in failed:
+                attempts = previous.get(uid, 0) + 1
+                if attempts > self.MAX_MESSAGE_RETRIES:
+                    logger.error(f"邮件多次处理失败，不再重试（保持未读）: uid={uid}, attempts={attempts}")
+                    continue
+                retries[uid] = attempts
+
+        if retries != previous:
+            self.queue.save_sync_retries(receiver.username, receiver.folder, uidvalidity, retries)
 
-            # 搜索未读邮件
-            unread_uids = self.receiver.search_unread()
-            logger.debug(f"发现 {len(unread_uids)} 封未读邮件")
+    def _receive_chunk(self, receiver: EmailReceiver, uids: list, outcomes: Dict[str, list]):
+        """
+        处理一批邮件：先只下载邮件头判断白名单和大小，再只为通过的邮件下载正文
 
-            for uid in unread_uids:
+        Args:
+            receiver: 邮件夹接收器
+            uids: 本批UID列表（升序）
+            outcomes: 处理结果 → UID列表（追加，用于批量标记已读和移动）
+        """
+        max_size = self.settings.get_max_message_size()
+        parser = self.parsers[receiver.username]
+        accepted = {}
+        rejected = set()
+        failed = set()
+
+        for uid, raw_headers, size in receiver.fetch_headers(uids):
+            verdict = parser.parse_headers(raw_headers)
+            verdict["account"] = receiver.username
+            if not verdict["is_whitelisted"]:
+                logger.warning(f"发件人不在白名单（未下载正文）: uid={uid}, sender={verdict['sender']}")
+                rejected.add(uid)
+            elif max_size and size > max_size:
+                logger.warning(f"邮件过大，拒绝处理: uid={uid}, size={size}, sender={verdict['sender']}")
                 try:
-                    raw_email = self.receiver.fetch_email(uid)
-                    if not raw_email:
-                        continue
-
-                    # 解析邮件
-                    parsed = self.parser.parse_email(raw_email)
-
-                    # 检查白名单
-                    if not parsed["is_whitelisted"]:
-                        logger.warning(f"发件人不在白名单: {parsed['sender']}")
-                        self.receiver.mark_as_read(uid)
-                        continue
-
-                    # 检查命令是否为空
-                    command = parsed["command"].strip()
-                    if not command:
-                        logger.info("邮件正文为空，跳过")
-                        self.receiver.mark_as_read(uid)
-                        continue
-
-                    # 加入队列
-                    cmd_id = self.queue.enqueue(
-                        sender=parsed["sender"],
-                        command=command,
-                        message_id=parsed["message_id"],
-                        subject=parsed["subject"]
+                    self._send_email(
+                        verdict,
+                        f"⚠️ 邮件过大，未处理 - {(verdict['subject'] or '无主题')[:30]}",
+                        f"邮件大小 {size} 字节，超过上限 {max_size} 字节，命令未执行。\n请去掉附件后重新发送。"
                     )
+                    rejected.add(uid)
+                except Exception as e:
+                    logger.error(f"处理邮件失败: uid={uid}, {e}")
+                    failed.add(uid)
+            else:
+                accepted[uid] = verdict
+
+        bodies = dict(receiver.fetch_emails(list(accepted), max_bytes=self.settings.get_max_body_fetch_bytes()))
+
+        # 批量较大时并行解析正文（临时文件形式的大邮件仍在本线程解析）
+        commands = {}
+        if self.parse_pool.should_use(len(bodies)):
+            commands = self.parse_pool.parse_bodies(
+                {uid: raw for uid, raw in bodies.items() if isinstance(raw, bytes)}
+            )
+
+        for uid in uids:
+            if uid in failed:
+                outcomes[self.OUTCOME_FAILED].append(uid)
+            elif uid in rejected:
+                outcomes[self.OUTCOME_REJECTED].append(uid)
+            elif uid in bodies:
+                raw_email = bodies.pop(uid)
+                try:
+                    self._handle_email(receiver, uid, raw_email, accepted[uid], commands.get(uid))
+                    outcomes[self.OUTCOME_PROCESSED].append(uid)
+                except Exception as e:
+                    logger.error(f"处理邮件失败: uid={uid}, {e}")
+                    outcomes[self.OUTCOME_FAILED].append(uid)
+                finally:
+                    # 大邮件为临时文件，处理完立即释放
+                    if hasattr(raw_email, "close"):
+                        raw_email.close()
+            # 其余为已被删除的邮件，直接跳过
+            self._advance_sync_state(receiver, uid)
+
+    def _handle_email(
+        self,
+        receiver: EmailReceiver,
+        uid: int,
+        raw_email: RawEmail,
+        verdict: dict,
+        command: Optional[str] = None
+    ):
+        """
+        提取已通过白名单的邮件正文并入队（或直接回答），由调用方批量标记已读
+
+        Args:
+            receiver: 邮件夹接收器
+            uid: 邮件UID
+            raw_email: 原始邮件字节或临时文件
+            verdict: 第一阶段邮件头解析结果（已通过白名单）
+            command: 进程池已解析出的命令正文，None表示在本线程解析
+        """
+        # 第二阶段：只为通过的邮件解析正文
+        parsed = dict(verdict)
+        if command is None:
+            command = self.parsers[receiver.username].parse_body(raw_email)
+        parsed["command"] = command
+
+        # 检查命令是否为空
+        command = parsed["command"].strip()
+        if not command:
+            logger.info("邮件正文为空，跳过")
+            return
 
-                    if cmd_id:
-                        logger.info(f"命令已加入队列: id={cmd_id}, from={parsed['sender']}")
+        # 管理命令（status、queue、cancel、retry、result、search:）直接回复，不调用Claude
+        answer = self.router.route(parsed["sender"], command)
+        if answer:
+            self._send_email(parsed, *answer)
+            return
 
-                    # 标记为已读
-                    self.receiver.mark_as_read(uid)
+        # 加入队列
+        cmd_id = self.queue.enqueue(
+            sender=parsed["sender"],
+            command=command,
+            message_id=parsed["message_id"],
+            subject=parsed["subject"],
+            account=receiver.username
+        )
 
-                except Exception as e:
-                    logger.error(f"处理邮件失败: {e}")
+        # 入队失败时抛出，邮件保持未读并在下一轮重试
+        if not cmd_id:
+            raise RuntimeError("命令入队失败")
+        logger.info(f"命令已加入队列: id={cmd_id}, from={parsed['sender']}")
 
-        except Exception as e:
-            logger.error(f"接收邮件失败: {e}")
+    def _find_new_uids(self, receiver: EmailReceiver) -> List[int]:
+        """
+        查找需要处理的新邮件UID
+
+        正常情况下只搜索 UID > last_uid 的邮件（刚SELECT且服务器支持CONDSTORE/QRESYNC时，
+        直接使用SELECT报告的变化邮件，无需搜索），并加上记录中待处理的UID；首次同步或UIDVALIDITY变化时，
+        先以当前最大UID作为增量起点，并把现有未读邮件记为待处理，本轮中断后下一轮继续处理剩余的未读邮件
+
+        Args:
+            receiver: 邮件夹接收器
+
+        Returns:
+            待处理UID列表（升序）
+        """
+        uidvalidity = receiver.uidvalidity or 0
+        state = self.queue.get_sync_state(receiver.username, receiver.folder)
+
+        if state and state["uidvalidity"] == uidvalidity:
+            retries = self.queue.get_sync_retries(receiver.username, receiver.folder, uidvalidity)
+            changed = receiver.take_resync_uids()
+            if changed is not None:
+                new_uids = [uid for uid in changed if uid > state["last_uid"]]
+            else:
+                new_uids = receiver.search_since_uid(state["last_uid"])
+            return sorted(set(new_uids).union(retries))
+
+        if state:
+            logger.warning(
+                f"UIDVALIDITY已变化 ({state['uidvalidity']} → {uidvalidity})，重新建立同步基线: "
+                f"{receiver.username}/{receiver.folder}"
+            )
+        baseline_uid = receiver.get_highest_uid()
+        # SELECT之后到达的未读邮件在基线之上，由下一轮增量搜索处理
+        unread = receiver.search_unread()
+        if unread and not baseline_uid:
+            logger.error(f"无法确定同步基线，本轮跳过: {receiver.username}/{receiver.folder}")
+            return []
+        unread = [uid for uid in unread if uid <= baseline_uid]
+        if not self.queue.reset_sync_state(receiver.username, receiver.folder, uidvalidity, baseline_uid, unread):
+            return []
+        return sorted(unread)
+
+    def _advance_sync_state(self, receiver: EmailReceiver, uid: int):
+        """记录已处理的最大UID"""
+        self.queue.save_sync_state(
+            receiver.username,
+            receiver.folder,
+            receiver.uidvalidity or 0,
+            int(uid)
+        )
+
+    def _process_queue(self) -> bool:
+        """
+        处理队列中的命令
 
-    def _process_queue(self):
-        """处理队列中的命令"""
+        Returns:
+            是否处理了命令
+        """
         cmd = self.queue.dequeue()
         if not cmd:
-            return
+            return False
 
         logger.info(f"开始处理命令: id={cmd['id']}, command={cmd['command'][:50]}...")
 
@@ -225,39 +568,54 @@ class EmailCommandApp:
             result = self.executor.execute(cmd["command"])
 
             if result["success"]:
-                # 成功
+                # 成功：结果邮件与完成状态在同一事务中写入发件箱
                 output = result["summary"] or result["output"]
-                self.queue.update_status(cmd["id"], CommandQueue.STATUS_COMPLETED, result=output)
-
-                # 发送结果邮件
-                self._send_result(cmd, output, success=True)
+                self.queue.update_status(
+                    cmd["id"], CommandQueue.STATUS_COMPLETED, result=output,
+                    reply=self._result_reply(cmd, output, success=True)
+                )
+                self.outbox.wake()
 
             else:
                 # 失败
                 error_msg = result.get("error", "未知错误")
-                self.queue.update_status(cmd["id"], CommandQueue.STATUS_FAILED, error=error_msg)
 
                 # 检查是否重试
                 if self.queue.should_retry(cmd["id"], self.settings.get_max_retries()):
+                    self.queue.update_status(cmd["id"], CommandQueue.STATUS_FAILED, error=error_msg)
                     retry_count = self.queue.increment_retry(cmd["id"])
                     logger.warning(f"命令执行失败，将重试 ({retry_count}/{self.settings.get_max_retries()}): {error_msg}")
                     self.queue.update_status(cmd["id"], CommandQueue.STATUS_PENDING)
                 else:
                     logger.error(f"命令执行失败，已达最大重试次数: {error_msg}")
-                    self._send_result(cmd, error_msg, success=False)
+                    self.queue.update_status(
+                        cmd["id"], CommandQueue.STATUS_FAILED, error=error_msg,
+                        reply=self._result_reply(cmd, error_msg, success=False)
+                    )
+                    self.outbox.wake()
 
         except Exception as e:
             logger.error(f"处理命令异常: {e}", exc_info=True)
-            self.queue.update_status(cmd["id"], CommandQueue.STATUS_FAILED, error=str(e))
+            # 失败通知与失败状态在同一事务中写入发件箱，发件人总能收到回复
+            self.queue.update_status(
+                cmd["id"], CommandQueue.STATUS_FAILED, error=str(e),
+                reply=self._result_reply(cmd, str(e), success=False)
+            )
+            self.outbox.wake()
 
-    def _send_result(self, cmd: dict, content: str, success: bool):
+        return True
+
+    def _result_reply(self, cmd: dict, content: str, success: bool) -> dict:
         """
-        发送结果邮件
+        构建结果邮件
 
         Args:
             cmd: 命令字典
             content: 结果内容
             success: 是否成功
+
+        Returns:
+            发件箱回复字典
         """
         # 空值检查 - 防止发送空白邮件
         if not content or not content.strip():
@@ -267,38 +625,78 @@ class EmailCommandApp:
             else:
                 content = f"命令执行失败，错误信息为空。\n\n命令: {cmd.get('command', 'N/A')}"
 
-        try:
-            # 确保SMTP连接正常
-            if not self.sender._connected:
-                if not self.sender.reconnect():
-                    logger.error("SMTP重连失败，无法发送结果邮件")
-                    return
+        # 构建主题
+        if success:
+            subject = f"✅ Claude执行完成 - {cmd.get('subject', '无主题')[:30]}"
+        else:
+            subject = f"❌ Claude执行失败 - {cmd.get('subject', '无主题')[:30]}"
+
+        reply = self._reply(cmd, subject, content)
+        reply["delay"] = self.digest_window
+        return reply
+
+    def _reply(self, cmd: dict, subject: str, content: str) -> dict:
+        """构建发给命令发件人的回复（通过接收该命令的账号发送，有Message-ID时作为回复）"""
+        return {
+            "recipient": cmd["sender"],
+            "subject": subject,
+            "body": content,
+            "account": cmd.get("account"),
+            "in_reply_to": cmd.get("message_id"),
+        }
+
+    def _send_email(self, cmd: dict, subject: str, content: str):
+        """
+        向命令发件人发送邮件：写入发件箱，由后台投递线程发送
 
-            # 构建主题
-            if success:
-                subject = f"✅ Claude执行完成 - {cmd.get('subject', '无主题')[:30]}"
-            else:
-                subject = f"❌ Claude执行失败 - {cmd.get('subject', '无主题')[:30]}"
-
-            # 发送回复邮件
-            if cmd.get("message_id"):
-                self.sender.send_reply(
-                    to=cmd["sender"],
-                    subject=subject,
-                    body=content,
-                    original_message_id=cmd["message_id"]
-                )
-            else:
-                self.sender.send_email(
-                    to=cmd["sender"],
-                    subject=subject,
-                    body=content
-                )
+        Args:
+            cmd: 命令字典（sender、message_id、account）
+            subject: 邮件主题
+            content: 邮件正文
+
+        Raises:
+            RuntimeError: 写入发件箱失败（收取时由调用方按处理失败重试）
+        """
+        if not self.queue.add_outbox(self._reply(cmd, subject, content)):
+            raise RuntimeError("写入发件箱失败")
+        self.outbox.wake()
 
-            logger.info(f"结果邮件已发送: to={cmd['sender']}")
+    def _send_outbox(self, item: dict) -> bool:
+        """
+        投递线程的发送函数（只有投递线程使用发送器，无需加锁）
 
-        except Exception as e:
-            logger.error(f"发送结果邮件失败: {e}")
+        Args:
+            item: 发件箱行或合并后的摘要（recipient、subject、body、account、in_reply_to，摘要另有references）
+
+        Returns:
+            是否发送成功
+        """
+        sender = self.senders.get(item["account"]) or self.sender
+        cmd = {"sender": item["recipient"], "message_id": item["in_reply_to"], "references": item.get("references")}
+        return self._send_with(sender, cmd, item["subject"], item["body"])
+
+    def _send_with(self, sender: EmailSender, cmd: dict, subject: str, content: str) -> bool:
+        """使用指定发送器发送邮件（会话检查和断线重连由发送器负责）"""
+        if cmd.get("message_id"):
+            sent = sender.send_reply(
+                to=cmd["sender"],
+                subject=subject,
+                body=content,
+                original_message_id=cmd["message_id"],
+                references=cmd.get("references")
+            )
+        else:
+            sent = sender.send_email(
+                to=cmd["sender"],
+                subject=subject,
+                body=content
+            )
+
+        if sent:
+            logger.info(f"结果邮件已发送: to={cmd['sender']}, from={sender.username}")
+        else:
+            logger.error(f"结果邮件发送失败: to={cmd['sender']}, from={sender.username}")
+        return sent
 
     def _shutdown(self):
         """优雅停机"""
@@ -306,11 +704,27 @@ class EmailCommandApp:
 
         self.running = False
 
+        # 停止后台清理
+        if self.retention:
+            self.retention.stop()
+
+        # 停止收取线程
+        for receiver in self.receivers:
+            receiver.interrupt_idle()
+        for thread in self._intake_threads:
+            thread.join(timeout=10)
+
+        # 停止解析子进程
+        self.parse_pool.close()
+
+        # 停止回复投递（等待正在发送的邮件完成，未发送的留在发件箱）
+        self.outbox.stop()
+
         # 断开邮件连接
-        if self.receiver:
-            self.receiver.disconnect()
-        if self.sender:
-            self.sender.disconnect()
+        for receiver in self.receivers:
+            receiver.disconnect()
+        for sender in self.senders.values():
+            sender.disconnect()
 
         # 释放队列资源
         if self.queue:
@@ -319,13 +733,21 @@ class EmailCommandApp:
         # 打印统计信息
         stats = self.queue.get_stats()
         logger.info(f"队列统计: {stats}")
+        outbox_stats = self.queue.get_outbox_stats()
+        if outbox_stats:
+            logger.info(f"发件箱未发送: {outbox_stats}")
 
         logger.info("系统已停机")
 
 
 def main():
     """主函数"""
-    app = EmailCommandApp()
+    parser = argparse.ArgumentParser(description="邮件双向通信系统")
+    parser.add_argument('--role', choices=EmailCommandApp.ROLES, default=EmailCommandApp.ROLE_ALL,
+                        help="运行角色: all=收取并执行, intake=只收取入队, worker=只执行队列")
+    args = parser.parse_args()
+
+    app = EmailCommandApp(role=args.role)
     app.start()
 
 
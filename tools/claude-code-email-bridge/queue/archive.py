@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+命令历史归档器
+将旧的已完成/失败命令流式导出为按日期分区的gzip压缩JSONL分段，并维护索引
+"""
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .manager import CommandQueue
+
+logger = logging.getLogger(__name__)
+
+
+class CommandArchiver:
+    """命令历史归档器"""
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, queue: CommandQueue, archive_dir: str):
+        """
+        初始化归档器
+
+        Args:
+            queue: 命令队列
+            archive_dir: 归档目录
+        """
+        self.queue = queue
+        self.archive_dir = Path(archive_dir).resolve()
+        self.index_path = self.archive_dir / self.INDEX_FILE
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+    def _load_index(self) -> Dict[str, Any]:
+        """加载归档索引"""
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"读取归档索引失败: {e}")
+        return {"pending_ids": [], "segments": {}}
+
+    def _save_index(self, index: Dict[str, Any]) -> None:
+        """原子写入归档索引"""
+        tmp_path = self.index_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def _segment_path(self, day: str) -> Path:
+        """获取某日分段文件的相对路径"""
+        year, month, _ = day.split("-")
+        return Path(year) / month / f"commands-{day}.jsonl.gz"
+
+    def _delete_ids(self, conn: sqlite3.Connection, ids: List[int]) -> None:
+        """删除已归档的命令"""
+        placeholders = ",".join("?" * len(ids))
+        conn.execute(f"DELETE FROM commands WHERE id IN ({placeholders})", ids)
+        conn.commit()
+
+    def archive(
+        self,
+        days: int = 7,
+        max_rows: Optional[int] = None,
+        chunk_size: int = CommandQueue.DEFAULT_PURGE_CHUNK_SIZE
+    ) -> int:
+        """
+        归档并删除超过保留天数的已完成/失败命令
+
+        按ID顺序分批读取，先追加写入分段并在索引中记录这些ID，再删除对应行，删除后从索引移除；
+        中途崩溃时，重复运行会跳过索引中已写入但未删除的ID，不会重复写入。
+        命令不按ID顺序结束（长任务、重试、多个执行进程），因此按实际ID判断是否已归档，而非最大ID
+
+        Args:
+            days: 保留天数（0表示归档全部已结束命令）
+            max_rows: 本次最多归档的行数，None表示不限制
+            chunk_size: 每批处理数量
+
+        Returns:
+            归档的命令数量
+        """
+        index = self._load_index()
+        # 旧版索引的最大ID水位线不可靠，已不再使用
+        index.pop("last_id", None)
+        pending = set(index.get("pending_ids", []))
+        total = 0
+
+        try:
+            with sqlite3.connect(self.queue.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                last_seen = 0
+
+                while max_rows is None or total < max_rows:
+                    limit = chunk_size if max_rows is None else min(chunk_size, max_rows - total)
+                    rows = conn.execute(
+                        """
+                        SELECT *, COALESCE(completed_at, updated_at) AS finished_at
+                        FROM commands
+                        WHERE id > ?
+                        AND status IN (?, ?)
+                        AND COALESCE(completed_at, updated_at) < datetime('now', '-' || ? || ' days')
+                        ORDER BY id ASC
+                        LIMIT ?
+                        """,
+                        (last_seen, CommandQueue.STATUS_COMPLETED, CommandQueue.STATUS_FAILED, days, limit)
+                    ).fetchall()
+                    if not rows:
+                        break
+                    last_seen = rows[-1]["id"]
+
+                    # 上次崩溃前已写入归档但未删除的行，直接删除
+                    fresh = [row for row in rows if row["id"] not in pending]
+                    if fresh:
+                        self._write_rows(fresh, index)
+                        pending.update(row["id"] for row in fresh)
+                        index["pending_ids"] = sorted(pending)
+                        self._save_index(index)
+
+                    ids = [row["id"] for row in rows]
+                    self._delete_ids(conn, ids)
+                    pending.difference_update(ids)
+                    index["pending_ids"] = sorted(pending)
+                    self._save_index(index)
+                    total += len(fresh)
+
+                    if len(rows) < limit:
+                        break
+        except Exception as e:
+            logger.error(f"归档命令失败: {e}")
+
+        if total > 0:
+            logger.info(f"归档命令: {total} 条 → {self.archive_dir}")
+        return total
+
+    def _write_rows(self, rows: List[sqlite3.Row], index: Dict[str, Any]) -> None:
+        """
+        按完成日期追加写入分段文件
+
+        gzip支持多成员追加，每批写入一个新成员，读取时透明拼接
+        """
+        by_day: Dict[str, List[Dict]] = {}
+        for row in rows:
+            record = dict(row)
+            day = (record.pop("finished_at") or "")[:10] or datetime.now().strftime("%Y-%m-%d")
+            by_day.setdefault(day, []).append(record)
+
+        for day, records in by_day.items():
+            rel_path = self._segment_path(day)
+            path = self.archive_dir / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+            segment = index["segments"].setdefault(day, {
+                "path": rel_path.as_posix(),
+                "count": 0,
+                "min_id": records[0]["id"],
+                "max_id": records[0]["id"],
+            })
+            segment["count"] += len(records)
+            segment["min_id"] = min(segment["min_id"], records[0]["id"])
+            segment["max_id"] = max(segment["max_id"], records[-1]["id"])
+            segment["bytes"] = path.stat().st_size
+
+    def iter_records(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        按日期范围遍历归档记录
+
+        Args:
+            start_date: 起始日期（YYYY-MM-DD，含）
+            end_date: 结束日期（YYYY-MM-DD，含）
+
+        Yields:
+            命令字典
+        """
+        segments = self._load_index()["segments"]
+        for day in sorted(segments):
+            if start_date and day < start_date:
+                continue
+            if end_date and day > end_date:
+                continue
+            path = self.archive_dir / segments[day]["path"]
+            if not path.exists():
+                logger.warning(f"归档分段缺失: {path}")
+                continue
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def search(
+        self,
+        keyword: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        在归档中搜索包含关键词的命令（命令、主题、结果、错误）
+
+        Args:
+            keyword: 关键词（不区分大小写）
+            start_date: 起始日期（YYYY-MM-DD，含）
+            end_date: 结束日期（YYYY-MM-DD，含）
+
+        Yields:
+            匹配的命令字典
+        """
+        needle = keyword.lower()
+        for record in self.iter_records(start_date, end_date):
+            for field in ("command", "subject", "result", "error"):
+                value = record.get(field)
+                if value and needle in value.lower():
+                    yield record
+                    break
@@ -4,15 +4,18 @@ SQLite命令队列管理器
 支持任务状态跟踪、重试机制、文件锁
 """
 
+import json
 import sqlite3
 import logging
 import os
 import sys
 import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from pathlib import Path
 
+from .notify import QueueNotifier
+
 # 跨平台文件锁
 if sys.platform == 'win32':
     import msvcrt
@@ -32,6 +35,31 @@ class CommandQueue:
     STATUS_COMPLETED = "completed"
     STATUS_FAILED = "failed"
 
+    # 发件人取消的命令标记为失败，错误信息为该值
+    CANCELLED_ERROR = "已被发件人取消"
+
+    # 回复发件箱状态
+    OUTBOX_PENDING = "pending"
+    OUTBOX_SENDING = "sending"
+    OUTBOX_FAILED = "failed"
+
+    # 清理默认值
+    DEFAULT_PURGE_CHUNK_SIZE = 500
+    DEFAULT_VACUUM_PAGES = 1000
+
+    # 出队锁：多个执行进程同时被唤醒时短暂重试的总时长和间隔（秒）
+    DEQUEUE_LOCK_TIMEOUT = 2.0
+    LOCK_RETRY_INTERVAL = 0.005
+
+    # 全文检索分词器（trigram支持中文子串匹配，旧版SQLite回退到unicode61）
+    FTS_TOKENIZERS = ("trigram", "unicode61")
+
+    # 分页查询的窄列投影（不读取完整命令和结果）
+    PAGE_COLUMNS = (
+        "id, sender, subject, status, retry_count, created_at, updated_at, completed_at, "
+        "substr(command, 1, 80) AS command_preview"
+    )
+
     def __init__(self, db_path: str = "commands.db", use_lock: bool = True):
         """
         初始化队列管理器
@@ -46,6 +74,9 @@ class CommandQueue:
         self.lock_file_path = str(db_path_obj.parent / f"{db_path_obj.name}.lock")
         self.lock_fd = None
         self._use_lock = use_lock
+        self._fts_enabled = False
+        self._fts_tokenizer: Optional[str] = None
+        self.notifier = QueueNotifier(self.db_path)
 
         # 确保目录存在
         db_path_obj.parent.mkdir(parents=True, exist_ok=True)
@@ -55,6 +86,8 @@ class CommandQueue:
     def _init_db(self) -> None:
         """初始化数据库表"""
         with sqlite3.connect(self.db_path) as conn:
+            self._enable_incremental_vacuum(conn)
+
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS commands (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -68,21 +101,150 @@ class CommandQueue:
                     retry_count INTEGER DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP
+                    completed_at TIMESTAMP,
+                    account TEXT
                 )
             """)
 
+            # 旧数据库迁移：接收命令的邮件账号
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(commands)")}
+            if "account" not in columns:
+                conn.execute("ALTER TABLE commands ADD COLUMN account TEXT")
+
             # 创建索引
             conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON commands(status)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_message_id ON commands(message_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_created_at ON commands(created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_status_created ON commands(status, created_at, id)")
+
+            # IMAP增量同步状态（每个账号/邮件夹一行）
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS mail_sync_state (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    last_uid INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    highestmodseq INTEGER,
+                    retry_uids TEXT,
+                    PRIMARY KEY (account, folder)
+                )
+            """)
+
+            # 回复发件箱：与命令完成状态在同一事务中写入，由后台发送线程投递
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    command_id INTEGER,
+                    account TEXT,
+                    recipient TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    in_reply_to TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+
+            # 旧数据库迁移：CONDSTORE/QRESYNC 快速重同步的 HIGHESTMODSEQ
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(mail_sync_state)")}
+            if "highestmodseq" not in columns:
+                conn.execute("ALTER TABLE mail_sync_state ADD COLUMN highestmodseq INTEGER")
+            # 旧数据库迁移：处理失败待重试的UID
+            if "retry_uids" not in columns:
+                conn.execute("ALTER TABLE mail_sync_state ADD COLUMN retry_uids TEXT")
 
             conn.commit()
 
-    def _acquire_lock(self) -> bool:
+            self._init_fts(conn)
+
+    def _init_fts(self, conn: sqlite3.Connection) -> None:
+        """
+        初始化FTS5全文索引（外部内容表 + 同步触发器）
+
+        SQLite未编译FTS5时降级为LIKE扫描
+        """
+        existing = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'commands_fts'"
+        ).fetchone()
+        if existing:
+            self._fts_enabled = True
+            self._fts_tokenizer = "trigram" if "trigram" in existing[0] else "unicode61"
+            return
+
+        for tokenizer in self.FTS_TOKENIZERS:
+            try:
+                conn.execute(f"""
+                    CREATE VIRTUAL TABLE commands_fts USING fts5(
+                        command, subject, result,
+                        content='commands', content_rowid='id',
+                        tokenize='{tokenizer}'
+                    )
+                """)
+                break
+            except sqlite3.OperationalError as e:
+                logger.debug(f"FTS5分词器 {tokenizer} 不可用: {e}")
+        else:
+            logger.warning("SQLite不支持FTS5，历史搜索将使用LIKE扫描")
+            return
+
+        conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS commands_fts_ai AFTER INSERT ON commands BEGIN
+                INSERT INTO commands_fts(rowid, command, subject, result)
+                VALUES (new.id, new.command, new.subject, new.result);
+            END;
+            CREATE TRIGGER IF NOT EXISTS commands_fts_ad AFTER DELETE ON commands BEGIN
+                INSERT INTO commands_fts(commands_fts, rowid, command, subject, result)
+                VALUES ('delete', old.id, old.command, old.subject, old.result);
+            END;
+            CREATE TRIGGER IF NOT EXISTS commands_fts_au AFTER UPDATE OF command, subject, result ON commands BEGIN
+                INSERT INTO commands_fts(commands_fts, rowid, command, subject, result)
+                VALUES ('delete', old.id, old.command, old.subject, old.result);
+                INSERT INTO commands_fts(rowid, command, subject, result)
+                VALUES (new.id, new.command, new.subject, new.result);
+            END;
+        """)
+        # 为已有数据建立索引
+        conn.execute("INSERT INTO commands_fts(commands_fts) VALUES ('rebuild')")
+        conn.commit()
+
+        self._fts_enabled = True
+        self._fts_tokenizer = tokenizer
+        logger.info(f"全文索引已创建: tokenizer={tokenizer}")
+
+    def _enable_incremental_vacuum(self, conn: sqlite3.Connection) -> None:
+        """
+        启用增量VACUUM模式
+
+        auto_vacuum只能在建表前或VACUUM时切换，旧数据库需要执行一次完整VACUUM
+        """
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode == 2:
+            return
+
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        has_tables = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'"
+        ).fetchone()[0]
+        if has_tables:
+            logger.info("转换数据库为增量VACUUM模式（一次性完整VACUUM）...")
+            conn.execute("VACUUM")
+
+    def _acquire_lock(self, timeout: float = 0.0) -> bool:
         """
         获取文件锁（跨平台）
 
+        多个执行进程被同一条通知同时唤醒时会争用该锁，持锁时间很短，
+        因此在超时内短暂重试，而不是立即当作队列为空
+
+        Args:
+            timeout: 等待锁的最长时间（秒），0表示只尝试一次
+
         Returns:
             是否成功获取锁
         """
@@ -91,26 +253,29 @@ class CommandQueue:
 
         try:
             self.lock_fd = open(self.lock_file_path, 'w')
+        except (IOError, OSError) as e:
+            logger.warning(f"无法获取文件锁: {e}")
+            return False
 
-            if sys.platform == 'win32':
-                # Windows: 使用 msvcrt.locking
-                try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if sys.platform == 'win32':
+                    # Windows: 使用 msvcrt.locking
                     msvcrt.locking(self.lock_fd.fileno(), msvcrt.LK_NBLCK, 1)
-                except (IOError, OSError):
-                    logger.warning("无法获取文件锁（Windows），可能有其他进程正在运行")
-                    return False
-            else:
-                # Unix: 使用 fcntl
-                try:
+                else:
+                    # Unix: 使用 fcntl
                     fcntl.flock(self.lock_fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
-                except (IOError, OSError):
-                    logger.warning("无法获取文件锁（Unix），可能有其他进程正在运行")
-                    return False
+                return True
+            except (IOError, OSError):
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(self.LOCK_RETRY_INTERVAL)
 
-            return True
-        except (IOError, OSError) as e:
-            logger.warning(f"无法获取文件锁: {e}")
-            return False
+        logger.warning("无法获取文件锁，可能有其他进程正在运行")
+        self.lock_fd.close()
+        self.lock_fd = None
+        return False
 
     def _release_lock(self) -> None:
         """释放文件锁（跨平台）"""
@@ -142,7 +307,8 @@ class CommandQueue:
         command: str,
         message_id: Optional[str] = None,
         subject: Optional[str] = None,
-        metadata: Optional[Dict] = None
+        metadata: Optional[Dict] = None,
+        account: Optional[str] = None
     ) -> Optional[int]:
         """
         将命令加入队列
@@ -153,6 +319,7 @@ class CommandQueue:
             message_id: 邮件Message-ID
             subject: 邮件主题
             metadata: 额外元数据
+            account: 接收该命令的邮件账号（用于回复）
 
         Returns:
             命令ID，失败返回None
@@ -161,15 +328,17 @@ class CommandQueue:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.execute(
                     """
-                    INSERT INTO commands (sender, command, message_id, subject)
-                    VALUES (?, ?, ?, ?)
+                    INSERT INTO commands (sender, command, message_id, subject, account)
+                    VALUES (?, ?, ?, ?, ?)
                     """,
-                    (sender, command, message_id, subject)
+                    (sender, command, message_id, subject, account)
                 )
                 conn.commit()
                 cmd_id = cursor.lastrowid
                 logger.info(f"命令入队: id={cmd_id}, sender={sender}, command={command[:50]}...")
-                return cmd_id
+            # 提交后唤醒等待中的工作进程
+            self.notifier.notify()
+            return cmd_id
         except sqlite3.IntegrityError:
             logger.warning(f"命令已存在（重复邮件）: message_id={message_id}")
             return None
@@ -184,41 +353,45 @@ class CommandQueue:
         Returns:
             命令字典，无可用命令返回None
         """
-        # 获取文件锁
-        if not self._acquire_lock():
+        # 获取文件锁（其他执行进程正在出队时短暂等待）
+        if not self._acquire_lock(timeout=self.DEQUEUE_LOCK_TIMEOUT):
             return None
 
         try:
             with sqlite3.connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
 
-                # 先获取待处理命令
-                cursor = conn.execute(
-                    """
-                    SELECT * FROM commands
-                    WHERE status = ?
-                    ORDER BY created_at ASC
-                    LIMIT 1
-                    """,
-                    (self.STATUS_PENDING,)
-                )
-                row = cursor.fetchone()
+                while True:
+                    # 先获取待处理命令
+                    cursor = conn.execute(
+                        """
+                        SELECT * FROM commands
+                        WHERE status = ?
+                        ORDER BY created_at ASC
+                        LIMIT 1
+                        """,
+                        (self.STATUS_PENDING,)
+                    )
+                    row = cursor.fetchone()
 
-                if not row:
-                    return None
+                    if not row:
+                        return None
 
-                cmd_id = row["id"]
+                    cmd_id = row["id"]
 
-                # 更新状态为处理中
-                conn.execute(
-                    """
-                    UPDATE commands
-                    SET status = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                    """,
-                    (self.STATUS_PROCESSING, cmd_id)
-                )
-                conn.commit()
+                    # 更新状态为处理中；期间被发件人取消或被其他进程领取时取下一条，
+                    # 而不是当作队列为空（否则已消费的唤醒通知会让剩余命令等到下次轮询）
+                    cursor = conn.execute(
+                        """
+                        UPDATE commands
+                        SET status = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ? AND status = ?
+                        """,
+                        (self.STATUS_PROCESSING, cmd_id, self.STATUS_PENDING)
+                    )
+                    conn.commit()
+                    if cursor.rowcount:
+                        break
 
                 # 再次查询以获取更新后的数据
                 cursor = conn.execute("SELECT * FROM commands WHERE id = ?", (cmd_id,))
@@ -238,7 +411,8 @@ class CommandQueue:
         cmd_id: int,
         status: str,
         result: Optional[str] = None,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        reply: Optional[Dict] = None
     ) -> bool:
         """
         更新命令状态
@@ -248,12 +422,16 @@ class CommandQueue:
             status: 新状态
             result: 执行结果
             error: 错误信息
+            reply: 要发送的回复（recipient、subject、body、account、in_reply_to，
+                   可选delay延迟发送秒数），与状态更新在同一事务中写入发件箱
 
         Returns:
             是否成功
         """
         try:
             with sqlite3.connect(self.db_path) as conn:
+                if reply:
+                    self._insert_outbox(conn, reply, cmd_id)
                 if status == self.STATUS_COMPLETED:
                     conn.execute(
                         """
@@ -287,6 +465,237 @@ class CommandQueue:
             logger.error(f"更新状态失败: {e}")
             return False
 
+    def _insert_outbox(self, conn: sqlite3.Connection, reply: Dict, cmd_id: Optional[int] = None) -> int:
+        """在调用方的事务中写入一条待发送回复"""
+        cursor = conn.execute(
+            """
+            INSERT INTO outbox (command_id, account, recipient, subject, body, in_reply_to, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now', '+' || ? || ' seconds'))
+            """,
+            (cmd_id, reply.get("account"), reply["recipient"], reply["subject"],
+             reply["body"], reply.get("in_reply_to"), int(reply.get("delay", 0)))
+        )
+        return cursor.lastrowid
+
+    def add_outbox(self, reply: Dict, cmd_id: Optional[int] = None) -> Optional[int]:
+        """
+        写入一条待发送回复（不伴随命令状态变化的回复，如历史搜索结果）
+
+        Args:
+            reply: 回复字典（recipient、subject、body、account、in_reply_to）
+            cmd_id: 关联的命令ID
+
+        Returns:
+            发件箱ID，失败返回None
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                outbox_id = self._insert_outbox(conn, reply, cmd_id)
+                conn.commit()
+                return outbox_id
+        except Exception as e:
+            logger.error(f"写入发件箱失败: {e}")
+            return None
+
+    def claim_outbox(self, limit: int = 10) -> List[Dict]:
+        """
+        领取到期的待发送回复（标记为sending，多进程同时领取时每条只会被一个进程领到）
+
+        Args:
+            limit: 最大数量
+
+        Returns:
+            回复列表
+        """
+        claimed = []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute(
+                    """
+                    SELECT * FROM outbox
+                    WHERE status = ? AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY id ASC
+                    LIMIT ?
+                    """,
+                    (self.OUTBOX_PENDING, limit)
+                ).fetchall()
+                for row in rows:
+                    cursor = conn.execute(
+                        """
+                        UPDATE outbox SET status = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ? AND status = ?
+                        """,
+                        (self.OUTBOX_SENDING, row["id"], self.OUTBOX_PENDING)
+                    )
+                    if cursor.rowcount:
+                        claimed.append(dict(row))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"领取发件箱失败: {e}")
+        return claimed
+
+    def claim_outbox_group(self, account: Optional[str], recipient: str, limit: int = 20) -> List[Dict]:
+        """
+        领取同一收件人（同一发送账号）其余待发送的命令结果回复，用于合并为摘要邮件（不论是否到期）
+
+        Args:
+            account: 发送账号
+            recipient: 收件人
+            limit: 最大数量
+
+        Returns:
+            回复列表
+        """
+        if limit <= 0:
+            return []
+
+        claimed = []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute(
+                    """
+                    SELECT * FROM outbox
+                    WHERE status = ? AND command_id IS NOT NULL
+                    AND account IS ? AND recipient = ?
+                    ORDER BY id ASC
+                    LIMIT ?
+                    """,
+                    (self.OUTBOX_PENDING, account, recipient, limit)
+                ).fetchall()
+                for row in rows:
+                    cursor = conn.execute(
+                        """
+                        UPDATE outbox SET status = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ? AND status = ?
+                        """,
+                        (self.OUTBOX_SENDING, row["id"], self.OUTBOX_PENDING)
+                    )
+                    if cursor.rowcount:
+                        claimed.append(dict(row))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"领取发件箱失败: {e}")
+        return claimed
+
+    def complete_outbox(self, outbox_id: int) -> bool:
+        """
+        回复已发送，从发件箱删除（结果本身保存在commands表中）
+
+        Args:
+            outbox_id: 发件箱ID
+
+        Returns:
+            是否成功
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("DELETE FROM outbox WHERE id = ?", (outbox_id,))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"更新发件箱失败: {e}")
+            return False
+
+    def retry_outbox(self, outbox_id: int, error: str, delay: float, max_attempts: int) -> bool:
+        """
+        回复发送失败，延迟后重试；超过最大次数标记为failed（保留在发件箱中供排查）
+
+        Args:
+            outbox_id: 发件箱ID
+            error: 错误信息
+            delay: 重试延迟（秒）
+            max_attempts: 最大尝试次数
+
+        Returns:
+            是否还会重试
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    """
+                    UPDATE outbox
+                    SET attempts = attempts + 1,
+                        status = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END,
+                        next_attempt_at = datetime('now', '+' || ? || ' seconds'),
+                        last_error = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                    """,
+                    (max_attempts, self.OUTBOX_FAILED, self.OUTBOX_PENDING, int(delay), error, outbox_id)
+                )
+                conn.commit()
+                row = conn.execute("SELECT status FROM outbox WHERE id = ?", (outbox_id,)).fetchone()
+                return bool(row) and row[0] == self.OUTBOX_PENDING
+        except Exception as e:
+            logger.error(f"更新发件箱失败: {e}")
+            return False
+
+    def release_outbox(self, outbox_ids: List[int]) -> int:
+        """
+        归还已领取但未发送的回复（停机时），不计入尝试次数
+
+        Args:
+            outbox_ids: 发件箱ID列表
+
+        Returns:
+            归还的数量
+        """
+        if not outbox_ids:
+            return 0
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                placeholders = ",".join("?" * len(outbox_ids))
+                cursor = conn.execute(
+                    f"""
+                    UPDATE outbox SET status = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE status = ? AND id IN ({placeholders})
+                    """,
+                    (self.OUTBOX_PENDING, self.OUTBOX_SENDING, *outbox_ids)
+                )
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"归还发件箱失败: {e}")
+            return 0
+
+    def reset_stuck_outbox(self, timeout_minutes: int = 10) -> int:
+        """
+        重置发送中断的回复（进程在发送中退出）
+
+        Args:
+            timeout_minutes: 超时时间（分钟）
+
+        Returns:
+            重置的数量
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    """
+                    UPDATE outbox
+                    SET status = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE status = ?
+                    AND updated_at < datetime('now', '-' || ? || ' minutes')
+                    """,
+                    (self.OUTBOX_PENDING, self.OUTBOX_SENDING, timeout_minutes)
+                )
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"重置发件箱失败: {e}")
+            return 0
+
+    def get_outbox_stats(self) -> Dict[str, int]:
+        """获取发件箱各状态数量"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        except Exception as e:
+            logger.error(f"获取发件箱统计失败: {e}")
+            return {}
+
     def increment_retry(self, cmd_id: int) -> int:
         """
         增加重试计数
@@ -407,33 +816,535 @@ class CommandQueue:
             logger.error(f"获取失败命令失败: {e}")
             return []
 
-    def delete_old_completed(self, days: int = 7) -> int:
+    def get_active_commands(self, sender: str, limit: int = 20) -> List[Dict]:
         """
-        删除旧的已完成命令
+        获取发件人排队中和执行中的命令（含前面还有多少条待处理命令）
 
         Args:
-            days: 保留天数
+            sender: 发件人邮箱
+            limit: 最大数量
 
         Returns:
-            删除的命令数量
+            命令列表（id、status、subject、preview、created_at、ahead）
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.execute(
+                    """
+                    SELECT c.id, c.status, c.subject, substr(c.command, 1, 60) AS preview, c.created_at,
+                           (SELECT COUNT(*) FROM commands p
+                            WHERE p.status = ? AND (p.created_at, p.id) < (c.created_at, c.id)) AS ahead
+                    FROM commands c
+                    WHERE c.sender = ? AND c.status IN (?, ?)
+                    ORDER BY c.created_at ASC, c.id ASC
+                    LIMIT ?
+                    """,
+                    (self.STATUS_PENDING, sender, self.STATUS_PROCESSING, self.STATUS_PENDING, limit)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"获取排队命令失败: {e}")
+            return []
+
+    def cancel(self, cmd_id: int, sender: str) -> bool:
+        """
+        取消发件人自己的待处理命令（标记为失败，执行中的命令无法取消）
+
+        Args:
+            cmd_id: 命令ID
+            sender: 发件人邮箱
+
+        Returns:
+            是否已取消
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    """
+                    UPDATE commands
+                    SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND sender = ? AND status = ?
+                    """,
+                    (self.STATUS_FAILED, self.CANCELLED_ERROR, cmd_id, sender, self.STATUS_PENDING)
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"取消命令失败: {e}")
+            return False
+
+    def requeue(self, cmd_id: int, sender: str) -> bool:
+        """
+        重新排队发件人自己的失败（或已取消）命令，重试计数清零
+
+        Args:
+            cmd_id: 命令ID
+            sender: 发件人邮箱
+
+        Returns:
+            是否已重新排队
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    """
+                    UPDATE commands
+                    SET status = ?, retry_count = 0, error = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND sender = ? AND status = ?
+                    """,
+                    (self.STATUS_PENDING, cmd_id, sender, self.STATUS_FAILED)
+                )
+                conn.commit()
+                requeued = cursor.rowcount > 0
+            if requeued:
+                self.notifier.notify()
+            return requeued
+        except Exception as e:
+            logger.error(f"重新排队失败: {e}")
+            return False
+
+    def get_sync_state(self, account: str, folder: str) -> Optional[Dict]:
+        """
+        获取邮件夹的增量同步状态
+
+        Args:
+            account: 邮箱账号
+            folder: 邮件夹
+
+        Returns:
+            状态字典（uidvalidity、last_uid、highestmodseq、retry_uids），不存在返回None
         """
         try:
             with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
                 cursor = conn.execute(
+                    "SELECT * FROM mail_sync_state WHERE account = ? AND folder = ?",
+                    (account, folder)
+                )
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"获取同步状态失败: {e}")
+            return None
+
+    def save_sync_state(self, account: str, folder: str, uidvalidity: int, last_uid: int) -> bool:
+        """
+        保存邮件夹的增量同步状态
+
+        UIDVALIDITY不变时last_uid只增不减；UIDVALIDITY变化时整体重置（含待重试UID）
+
+        Args:
+            account: 邮箱账号
+            folder: 邮件夹
+            uidvalidity: 邮件夹UIDVALIDITY
+            last_uid: 已处理的最大UID
+
+        Returns:
+            是否成功
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
                     """
-                    DELETE FROM commands
-                    WHERE status IN ('completed', 'failed')
-                    AND completed_at < datetime('now', '-' || ? || ' days')
+                    INSERT INTO mail_sync_state (account, folder, uidvalidity, last_uid)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (account, folder) DO UPDATE SET
+                        last_uid = CASE WHEN uidvalidity = excluded.uidvalidity
+                                        THEN MAX(last_uid, excluded.last_uid)
+                                        ELSE excluded.last_uid END,
+                        highestmodseq = CASE WHEN uidvalidity = excluded.uidvalidity
+                                             THEN highestmodseq ELSE NULL END,
+                        retry_uids = CASE WHEN uidvalidity = excluded.uidvalidity
+                                          THEN retry_uids ELSE NULL END,
+                        uidvalidity = excluded.uidvalidity,
+                        updated_at = CURRENT_TIMESTAMP
                     """,
-                    (days,)
+                    (account, folder, uidvalidity, last_uid)
                 )
                 conn.commit()
-                deleted = cursor.rowcount
-                if deleted > 0:
-                    logger.info(f"清理旧命令: {deleted} 条")
-                return deleted
+                return True
+        except Exception as e:
+            logger.error(f"保存同步状态失败: {e}")
+            return False
+
+    def reset_sync_state(
+        self, account: str, folder: str, uidvalidity: int, last_uid: int, pending_uids: List[int]
+    ) -> bool:
+        """
+        首次同步或UIDVALIDITY变化时重建同步基线
+
+        基线与待处理的未读UID在同一语句中写入：本轮中途中断时，下一轮只处理剩余的未读邮件，
+        不会把基线以下的已读邮件当作新邮件
+
+        Args:
+            account: 邮箱账号
+            folder: 邮件夹
+            uidvalidity: 邮件夹UIDVALIDITY
+            last_uid: 基线UID（当前最大UID）
+            pending_uids: 基线以下待处理的未读UID
+
+        Returns:
+            是否成功
+        """
+        retries = json.dumps({str(uid): 0 for uid in sorted(pending_uids)}) if pending_uids else None
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    """
+                    INSERT INTO mail_sync_state (account, folder, uidvalidity, last_uid, retry_uids)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (account, folder) DO UPDATE SET
+                        uidvalidity = excluded.uidvalidity,
+                        last_uid = excluded.last_uid,
+                        highestmodseq = NULL,
+                        retry_uids = excluded.retry_uids,
+                        updated_at = CURRENT_TIMESTAMP
+                    """,
+                    (account, folder, uidvalidity, last_uid, retries)
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"保存同步状态失败: {e}")
+            return False
+
+    def save_sync_modseq(self, account: str, folder: str, uidvalidity: int, highestmodseq: int) -> bool:
+        """
+        记录已完整同步到的HIGHESTMODSEQ（只在UIDVALIDITY一致时更新）
+
+        Args:
+            account: 邮箱账号
+            folder: 邮件夹
+            uidvalidity: 邮件夹UIDVALIDITY
+            highestmodseq: 同步开始时邮件夹的HIGHESTMODSEQ
+
+        Returns:
+            是否更新
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    """
+                    UPDATE mail_sync_state
+                    SET highestmodseq = MAX(COALESCE(highestmodseq, 0), ?), updated_at = CURRENT_TIMESTAMP
+                    WHERE account = ? AND folder = ? AND uidvalidity = ?
+                    """,
+                    (highestmodseq, account, folder, uidvalidity)
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"保存同步状态失败: {e}")
+            return False
+
+    def get_sync_retries(self, account: str, folder: str, uidvalidity: int) -> Dict[int, int]:
+        """
+        获取待下一轮处理的UID（处理失败待重试的邮件，以及重建基线时尚未处理的未读邮件）
+
+        Args:
+            account: 邮箱账号
+            folder: 邮件夹
+            uidvalidity: 邮件夹UIDVALIDITY（不一致时视为没有）
+
+        Returns:
+            UID → 已失败次数（0表示尚未处理）
+        """
+        state = self.get_sync_state(account, folder)
+        if not state or state["uidvalidity"] != uidvalidity or not state.get("retry_uids"):
+            return {}
+        try:
+            return {int(uid): int(attempts) for uid, attempts in json.loads(state["retry_uids"]).items()}
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"待重试UID解析失败，已忽略: {e}")
+            return {}
+
+    def save_sync_retries(self, account: str, folder: str, uidvalidity: int, retries: Dict[int, int]) -> bool:
+        """
+        记录处理失败、待下一轮重试的UID（只在UIDVALIDITY一致时更新）
+
+        Args:
+            account: 邮箱账号
+            folder: 邮件夹
+            uidvalidity: 邮件夹UIDVALIDITY
+            retries: UID → 已失败次数，为空时清除
+
+        Returns:
+            是否更新
+        """
+        value = json.dumps({str(uid): attempts for uid, attempts in sorted(retries.items())}) if retries else None
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    """
+                    UPDATE mail_sync_state
+                    SET retry_uids = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE account = ? AND folder = ? AND uidvalidity = ?
+                    """,
+                    (value, account, folder, uidvalidity)
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"保存同步状态失败: {e}")
+            return False
+
+    def page_commands(
+        self,
+        status: Optional[str] = None,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 50,
+        descending: bool = False
+    ) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """
+        按 (created_at, id) 键集分页查询命令
+
+        基于游标定位而非OFFSET，每页代价与翻页深度无关
+
+        Args:
+            status: 只查询该状态的命令，None表示全部
+            after: 上一页返回的游标 (created_at, id)，None表示第一页
+            limit: 每页数量
+            descending: 是否按时间倒序
+
+        Returns:
+            (命令列表, 下一页游标)，没有更多数据时游标为None
+        """
+        op, order = ("<", "DESC") if descending else (">", "ASC")
+        conditions = []
+        params: List[Any] = []
+
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if after:
+            conditions.append(f"(created_at, id) {op} (?, ?)")
+            params.extend(after)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit + 1)
+
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.execute(
+                    f"""
+                    SELECT {self.PAGE_COLUMNS} FROM commands
+                    {where}
+                    ORDER BY created_at {order}, id {order}
+                    LIMIT ?
+                    """,
+                    params
+                )
+                rows = [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"分页查询命令失败: {e}")
+            return [], None
+
+        if len(rows) <= limit:
+            return rows, None
+
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, (last["created_at"], last["id"])
+
+    def search(self, query: str, sender: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """
+        全文搜索命令历史（命令、主题、结果）
+
+        Args:
+            query: 搜索词，空白分隔的多个词按AND匹配
+            sender: 只搜索该发件人的命令
+            limit: 最大数量
+
+        Returns:
+            命令列表（按相关度排序，包含snippet摘要）
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        # trigram分词无法匹配少于3个字符的词，此时回退到LIKE
+        use_fts = self._fts_enabled and not (
+            self._fts_tokenizer == "trigram" and any(len(term) < 3 for term in terms)
+        )
+
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                if use_fts:
+                    match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+                    sql = """
+                        SELECT c.id, c.sender, c.subject, c.status, c.created_at, c.completed_at,
+                               snippet(commands_fts, -1, '[', ']', '...', 16) AS snippet
+                        FROM commands_fts
+                        JOIN commands c ON c.id = commands_fts.rowid
+                        WHERE commands_fts MATCH ?
+                    """
+                    params: List[Any] = [match]
+                    if sender:
+                        sql += " AND c.sender = ?"
+                        params.append(sender)
+                    sql += " ORDER BY rank LIMIT ?"
+                else:
+                    sql = """
+                        SELECT id, sender, subject, status, created_at, completed_at,
+                               substr(COALESCE(result, command), 1, 120) AS snippet
+                        FROM commands
+                        WHERE 1 = 1
+                    """
+                    params = []
+                    for term in terms:
+                        sql += " AND (command LIKE ? OR subject LIKE ? OR result LIKE ?)"
+                        pattern = f"%{term}%"
+                        params.extend([pattern, pattern, pattern])
+                    if sender:
+                        sql += " AND sender = ?"
+                        params.append(sender)
+                    sql += " ORDER BY id DESC LIMIT ?"
+                params.append(limit)
+
+                cursor = conn.execute(sql, params)
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"搜索命令历史失败: {e}")
+            return []
+
+    def delete_old_completed(self, days: int = 7) -> int:
+        """
+        删除旧的已完成命令
+
+        Args:
+            days: 保留天数
+
+        Returns:
+            删除的命令数量
+        """
+        return self.purge_expired(days=days)
+
+    def purge_expired(self, days: int = 7, chunk_size: int = DEFAULT_PURGE_CHUNK_SIZE) -> int:
+        """
+        分批删除超过保留天数的已完成/失败命令
+
+        每批在独立事务中提交，避免长时间持有写锁阻塞入队和出队
+
+        Args:
+            days: 保留天数
+            chunk_size: 每批删除数量
+
+        Returns:
+            删除的命令数量
+        """
+        total = 0
+        try:
+            while True:
+                with sqlite3.connect(self.db_path) as conn:
+                    cursor = conn.execute(
+                        """
+                        DELETE FROM commands WHERE id IN (
+                            SELECT id FROM commands
+                            WHERE status IN (?, ?)
+                            AND COALESCE(completed_at, updated_at) < datetime('now', '-' || ? || ' days')
+                            ORDER BY id ASC
+                            LIMIT ?
+                        )
+                        """,
+                        (self.STATUS_COMPLETED, self.STATUS_FAILED, days, chunk_size)
+                    )
+                    conn.commit()
+                    deleted = cursor.rowcount
+                total += deleted
+                if deleted < chunk_size:
+                    break
         except Exception as e:
             logger.error(f"清理旧命令失败: {e}")
+
+        if total > 0:
+            logger.info(f"清理旧命令: {total} 条")
+        return total
+
+    def purge_to_size(self, max_bytes: int, chunk_size: int = DEFAULT_PURGE_CHUNK_SIZE) -> int:
+        """
+        按数据库大小预算分批删除最旧的已完成/失败命令
+
+        每删除一批即回收空闲页，直到数据库大小不超过预算或没有可删除的命令
+
+        Args:
+            max_bytes: 数据库大小上限（字节），<=0表示不限制
+            chunk_size: 每批删除数量
+
+        Returns:
+            删除的命令数量
+        """
+        if max_bytes <= 0:
+            return 0
+
+        total = 0
+        try:
+            while self.get_db_size() > max_bytes:
+                with sqlite3.connect(self.db_path) as conn:
+                    cursor = conn.execute(
+                        """
+                        DELETE FROM commands WHERE id IN (
+                            SELECT id FROM commands
+                            WHERE status IN (?, ?)
+                            ORDER BY id ASC
+                            LIMIT ?
+                        )
+                        """,
+                        (self.STATUS_COMPLETED, self.STATUS_FAILED, chunk_size)
+                    )
+                    conn.commit()
+                    deleted = cursor.rowcount
+                if deleted == 0:
+                    logger.warning(f"数据库超出大小预算，但已无可清理的命令: {self.get_db_size()} 字节")
+                    break
+                total += deleted
+                self.incremental_vacuum()
+        except Exception as e:
+            logger.error(f"按大小清理命令失败: {e}")
+
+        if total > 0:
+            logger.info(f"按大小预算清理命令: {total} 条")
+        return total
+
+    def incremental_vacuum(self, pages: int = DEFAULT_VACUUM_PAGES) -> int:
+        """
+        增量回收空闲页，缩小数据库文件
+
+        Args:
+            pages: 单次最多回收的页数
+
+        Returns:
+            回收的页数
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if before == 0:
+                    return 0
+                conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+                after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                return before - after
+        except Exception as e:
+            logger.error(f"增量VACUUM失败: {e}")
+            return 0
+
+    def get_db_size(self) -> int:
+        """
+        获取数据库有效大小（不含空闲页）
+
+        Returns:
+            字节数
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+                freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                return (page_count - freelist) * page_size
+        except Exception as e:
+            logger.error(f"获取数据库大小失败: {e}")
             return 0
 
     def get_stats(self) -> Dict[str, int]:
@@ -483,13 +1394,29 @@ class CommandQueue:
                 )
                 conn.commit()
                 reset = cursor.rowcount
-                if reset > 0:
-                    logger.warning(f"重置卡住的命令: {reset} 条")
-                return reset
+            if reset > 0:
+                logger.warning(f"重置卡住的命令: {reset} 条")
+                self.notifier.notify()
+            return reset
         except Exception as e:
             logger.error(f"重置卡住的命令失败: {e}")
             return 0
 
+    def wait_for_work(self, timeout: float) -> bool:
+        """
+        阻塞等待新命令入队（跨进程）
+
+        首次调用时绑定唤醒通道；平台不支持时退化为休眠timeout秒
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            是否被入队通知唤醒
+        """
+        self.notifier.listen()
+        return self.notifier.wait(timeout)
+
     def close(self) -> None:
         """
         关闭队列管理器，释放所有资源
@@ -498,4 +1425,5 @@ class CommandQueue:
         """
         logger.info("关闭队列管理器，释放资源...")
         self._release_lock()
+        self.notifier.close()
         logger.info("队列管理器已关闭")
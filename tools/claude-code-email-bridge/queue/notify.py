@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+跨进程入队唤醒通知
+基于Unix数据报套接字：每个等待者在数据库旁的 .notify 目录绑定一个套接字，
+入队方提交后向目录内所有套接字发送一个字节，等待者用select阻塞，无需空轮询
+"""
+
+import hashlib
+import logging
+import os
+import select
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueNotifier:
+    """入队唤醒通知器"""
+
+    # AF_UNIX 套接字路径长度上限（Linux 108，macOS 104）
+    MAX_SOCKET_PATH = 100
+
+    def __init__(self, db_path: str):
+        """
+        初始化通知器
+
+        Args:
+            db_path: 数据库文件路径（通知目录位于其旁边）
+        """
+        notify_dir = Path(f"{db_path}.notify")
+        if len(str(notify_dir)) + 24 > self.MAX_SOCKET_PATH:
+            # 路径过长时改用临时目录，按数据库路径哈希区分
+            digest = hashlib.sha1(db_path.encode("utf-8")).hexdigest()[:12]
+            notify_dir = Path(tempfile.gettempdir()) / f"cmdq-{digest}.notify"
+
+        self.notify_dir = notify_dir
+        self.supported = sys.platform != "win32" and hasattr(socket, "AF_UNIX")
+        self._sock: Optional[socket.socket] = None
+        self._sock_path: Optional[Path] = None
+
+    def listen(self) -> bool:
+        """
+        绑定本进程的唤醒套接字
+
+        应在第一次出队之前调用，之后到达的通知会缓存在套接字中，不会丢失
+
+        Returns:
+            是否成功（平台不支持时返回False，等待将退化为休眠轮询）
+        """
+        if self._sock:
+            return True
+        if not self.supported:
+            return False
+
+        try:
+            self.notify_dir.mkdir(parents=True, exist_ok=True)
+            path = self.notify_dir / f"{os.getpid()}-{id(self) & 0xffff:x}.sock"
+            if path.exists():
+                path.unlink()
+
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(str(path))
+            sock.setblocking(False)
+
+            self._sock = sock
+            self._sock_path = path
+            logger.info(f"入队唤醒通道已就绪: {path}")
+            return True
+        except OSError as e:
+            logger.warning(f"创建入队唤醒通道失败，将使用轮询: {e}")
+            return False
+
+    def notify(self) -> int:
+        """
+        唤醒所有等待者
+
+        没有等待者或发送失败都不影响入队；对端已退出的陈旧套接字会被清理
+
+        Returns:
+            成功通知的等待者数量
+        """
+        if not self.supported or not self.notify_dir.is_dir():
+            return 0
+
+        notified = 0
+        sender = None
+        try:
+            sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.setblocking(False)
+            for path in self.notify_dir.glob("*.sock"):
+                try:
+                    sender.sendto(b"1", str(path))
+                    notified += 1
+                except BlockingIOError:
+                    # 缓冲区已满，说明已有未处理的唤醒
+                    notified += 1
+                except (ConnectionRefusedError, FileNotFoundError):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+                except OSError as e:
+                    logger.debug(f"发送唤醒通知失败: {path}: {e}")
+        except OSError as e:
+            logger.debug(f"发送唤醒通知失败: {e}")
+        finally:
+            if sender:
+                sender.close()
+        return notified
+
+    def interrupt(self) -> None:
+        """唤醒本进程的等待（用于停机）"""
+        if not self._sock or not self._sock_path:
+            return
+        try:
+            self._sock.sendto(b"0", str(self._sock_path))
+        except OSError:
+            pass
+
+    def wait(self, timeout: float) -> bool:
+        """
+        阻塞等待入队通知
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            是否收到通知（超时返回False）
+        """
+        if not self._sock:
+            time.sleep(timeout)
+            return False
+
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        if not readable:
+            return False
+
+        # 合并多次通知
+        try:
+            while True:
+                self._sock.recv(64)
+        except (BlockingIOError, InterruptedError):
+            pass
+        return True
+
+    def close(self) -> None:
+        """关闭并删除本进程的唤醒套接字"""
+        if self._sock:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+        if self._sock_path:
+            try:
+                self._sock_path.unlink()
+            except OSError:
+                pass
+            self._sock_path = None
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+回复发件箱投递线程
+执行者只把回复写入发件箱（与命令完成状态同一事务），由后台线程发送并按指数退避重试，
+SMTP缓慢或不可用时不阻塞执行，回复也不会丢失
+
+摘要模式：命令结果回复延迟一个窗口再发送，窗口内同一收件人的其余结果合并为一封线程化邮件
+"""
+
+import logging
+import random
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .manager import CommandQueue
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """后台回复投递线程"""
+
+    DEFAULT_BATCH_SIZE = 10
+    DEFAULT_POLL_INTERVAL = 5
+    DEFAULT_MAX_ATTEMPTS = 20
+    RETRY_BACKOFF_BASE = 30
+    RETRY_BACKOFF_MAX = 3600
+    # 一封摘要邮件最多合并的回复数
+    DIGEST_MAX_ITEMS = 20
+
+    def __init__(
+        self,
+        queue: CommandQueue,
+        send: Callable[[Dict], bool],
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        digest_window: int = 0
+    ):
+        """
+        初始化投递线程
+
+        Args:
+            queue: 命令队列（发件箱所在数据库）
+            send: 发送函数，参数为发件箱行字典，返回是否发送成功
+            poll_interval: 无唤醒时检查到期重试的间隔（秒）
+            max_attempts: 最大尝试次数，超过后标记为failed
+            batch_size: 每次领取的数量
+            digest_window: 摘要窗口（秒），0表示不合并；命令结果回复写入时需延迟同样时间
+        """
+        self.queue = queue
+        self.send = send
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.digest_window = digest_window
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def wake(self) -> None:
+        """有新回复写入时唤醒投递线程"""
+        self._wake_event.set()
+
+    def run_once(self) -> int:
+        """
+        投递一批到期的回复
+
+        Returns:
+            成功发送的数量
+        """
+        sent = 0
+        groups = self._group(self.queue.claim_outbox(limit=self.batch_size))
+        for index, rows in enumerate(groups):
+            if self._stop_event.is_set():
+                # 停机时未发送的回复归还，留给下次启动
+                self.queue.release_outbox([row["id"] for group in groups[index:] for row in group])
+                break
+            sent += self._send_rows(rows)
+        return sent
+
+    def _group(self, claimed: List[Dict]) -> List[List[Dict]]:
+        """
+        摘要模式下把命令结果回复按（发送账号, 收件人）分组，并补领同一收件人其余待发送的结果
+
+        Args:
+            claimed: 已领取的回复
+
+        Returns:
+            分组列表，每组发送一封邮件
+        """
+        if self.digest_window <= 0:
+            return [[row] for row in claimed]
+
+        groups: List[List[Dict]] = []
+        by_recipient: Dict[tuple, List[Dict]] = {}
+        for row in claimed:
+            if row["command_id"] is None:
+                groups.append([row])
+                continue
+            key = (row["account"], row["recipient"])
+            group = by_recipient.get(key)
+            if group is None or len(group) >= self.DIGEST_MAX_ITEMS:
+                group = by_recipient[key] = []
+                groups.append(group)
+            group.append(row)
+
+        for (account, recipient), group in by_recipient.items():
+            group.extend(self.queue.claim_outbox_group(
+                account, recipient, limit=self.DIGEST_MAX_ITEMS - len(group)
+            ))
+        return groups
+
+    def _digest(self, rows: List[Dict]) -> Dict:
+        """把同一收件人的多条回复合并为一封摘要（回复第一封命令邮件，References包含全部）"""
+        message_ids = [row["in_reply_to"] for row in rows if row["in_reply_to"]]
+        sections = [f"共 {len(rows)} 条命令结果", ""]
+        for index, row in enumerate(rows, 1):
+            sections.append(f"{'=' * 20} {index}/{len(rows)} {row['subject']} {'=' * 20}")
+            sections.append(row["body"])
+            sections.append("")
+
+        return {
+            "account": rows[0]["account"],
+            "recipient": rows[0]["recipient"],
+            "subject": f"📬 Claude执行结果汇总（{len(rows)} 条）",
+            "body": "\n".join(sections),
+            "in_reply_to": message_ids[0] if message_ids else None,
+            "references": message_ids,
+        }
+
+    def _send_rows(self, rows: List[Dict]) -> int:
+        """
+        发送一组回复（多条时合并为摘要），失败时每条分别退避重试
+
+        Returns:
+            成功发送的回复数量
+        """
+        item = rows[0] if len(rows) == 1 else self._digest(rows)
+        try:
+            ok = self.send(item)
+            error = "发送失败"
+        except Exception as e:
+            ok = False
+            error = str(e)
+
+        if ok:
+            if len(rows) > 1:
+                logger.info(f"已合并 {len(rows)} 条回复发送: to={item['recipient']}")
+            for row in rows:
+                self.queue.complete_outbox(row["id"])
+            return len(rows)
+
+        for row in rows:
+            delay = self._backoff(row["attempts"])
+            if self.queue.retry_outbox(row["id"], error, delay, self.max_attempts):
+                logger.warning(f"回复发送失败，{delay:.0f} 秒后重试: outbox={row['id']}, to={row['recipient']}, {error}")
+            else:
+                logger.error(f"回复发送失败，已达最大尝试次数: outbox={row['id']}, to={row['recipient']}, {error}")
+        return 0
+
+    def _backoff(self, attempts: int) -> float:
+        """第attempts次失败后的重试延迟（指数退避，带抖动）"""
+        delay = min(self.RETRY_BACKOFF_BASE * (2 ** attempts), self.RETRY_BACKOFF_MAX)
+        return delay * random.uniform(0.8, 1.2)
+
+    def _run(self) -> None:
+        """投递线程主循环"""
+        logger.info("回复投递线程启动")
+        while not self._stop_event.is_set():
+            try:
+                self.queue.reset_stuck_outbox()
+                while self.run_once() > 0 and not self._stop_event.is_set():
+                    pass
+            except Exception as e:
+                logger.error(f"回复投递异常: {e}", exc_info=True)
+
+            self._wake_event.wait(self.poll_interval)
+            self._wake_event.clear()
+        logger.info("回复投递线程已停止")
+
+    def start(self) -> None:
+        """启动后台线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """
+        停止后台线程（等待正在进行的发送完成）
+
+        Args:
+            timeout: 等待线程退出的超时（秒）
+        """
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+命令队列保留策略调度器
+后台定期按保留天数和数据库大小预算分批清理，并增量回收空间
+"""
+
+import logging
+import threading
+from typing import Optional
+
+from .archive import CommandArchiver
+from .manager import CommandQueue
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionScheduler:
+    """后台保留策略调度器"""
+
+    def __init__(
+        self,
+        queue: CommandQueue,
+        days: int = 7,
+        max_db_bytes: int = 0,
+        interval: int = 3600,
+        chunk_size: int = CommandQueue.DEFAULT_PURGE_CHUNK_SIZE,
+        archiver: Optional[CommandArchiver] = None
+    ):
+        """
+        初始化调度器
+
+        Args:
+            queue: 命令队列
+            days: 已完成命令保留天数
+            max_db_bytes: 数据库大小上限（字节），0表示不限制
+            interval: 清理间隔（秒）
+            chunk_size: 每批删除数量
+            archiver: 归档器，设置后清理前先归档，不再直接丢弃历史
+        """
+        self.queue = queue
+        self.days = days
+        self.max_db_bytes = max_db_bytes
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.archiver = archiver
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        """
+        执行一次清理
+
+        Returns:
+            删除的命令数量
+        """
+        deleted = 0
+        if self.archiver:
+            # 只删除已归档的行；归档失败时保留历史，下次再试，不能退回直接清理
+            deleted += self.archiver.archive(days=self.days, chunk_size=self.chunk_size)
+            deleted += self._archive_to_size()
+        else:
+            deleted += self.queue.purge_expired(days=self.days, chunk_size=self.chunk_size)
+            deleted += self.queue.purge_to_size(self.max_db_bytes, chunk_size=self.chunk_size)
+
+        reclaimed = self.queue.incremental_vacuum()
+        if reclaimed > 0:
+            logger.info(f"增量VACUUM回收 {reclaimed} 页")
+
+        return deleted
+
+    def _archive_to_size(self) -> int:
+        """超出大小预算时，按ID顺序分批归档最旧的已结束命令"""
+        if self.max_db_bytes <= 0:
+            return 0
+
+        archived = 0
+        while self.queue.get_db_size() > self.max_db_bytes:
+            count = self.archiver.archive(days=0, max_rows=self.chunk_size, chunk_size=self.chunk_size)
+            if count == 0:
+                break
+            archived += count
+            self.queue.incremental_vacuum()
+        return archived
+
+    def _run(self) -> None:
+        """调度线程主循环"""
+        logger.info(
+            f"保留策略调度器启动: days={self.days}, "
+            f"max_db_bytes={self.max_db_bytes}, interval={self.interval}s"
+        )
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"保留策略执行异常: {e}", exc_info=True)
+            self._stop_event.wait(self.interval)
+        logger.info("保留策略调度器已停止")
+
+    def start(self) -> None:
+        """启动后台线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        停止后台线程
+
+        Args:
+            timeout: 等待线程退出的超时（秒）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None